@@ -6,98 +6,416 @@ Supports concurrent message sending/receiving and file operations
 import socket
 import threading
 import os
+import mmap
+import struct
+import selectors
 import sys
+import time
+import argparse
 
-BUFFER_SIZE = 4096
-running = True
+BUFFER_SIZE = 65536
+SENDFILE_CHUNK = 1024 * 1024
+stop = threading.Event()  # Set once the session is over (by either thread)
 
+# Everything the server sends is a frame: kind byte + payload length + payload
+FRAME_HEADER = struct.Struct("!cI")
+FRAME_TEXT = b"T"   # chat and notifications (UTF-8)
+FRAME_READY = b"R"  # download accepted; payload is the file size and CRC-32
+FRAME_ERROR = b"E"  # download refused; payload is the error message
+FRAME_DATA = b"D"   # a piece of the file being downloaded
+FILE_INFO = struct.Struct("!QI")
 
-def receive_messages(sock):
-    """Continuously receive and display messages from server"""
-    global running
+# Bytes read from the server but not yet consumed as frames. Shared by the
+# receive thread and file transfers (which only run while it is parked).
+inbox = bytearray()
+
+# Sent right after /upload: filename length and file size, then the filename
+UPLOAD_HEADER = struct.Struct("!HQ")
+
+# Bytes the main thread writes to the receiver's wakeup socket
+WAKE_STOP = b"x"
+WAKE_PAUSE = b"p"
+
+# Handshake for parking the receive thread while a file transfer reads the socket
+receiver_paused = threading.Event()
+receiver_resume = threading.Event()
+
+
+def tune_socket(sock, sndbuf=None, rcvbuf=None):
+    """Disable Nagle and delayed ACKs, and optionally size the kernel socket buffers.
     
-    while running:
-        try:
-            data = sock.recv(BUFFER_SIZE)
-            if not data:
-                print("\n[DISCONNECTED] Connection lost.")
-                running = False
+    Buffer sizes are only applied when given explicitly, so by default the
+    kernel's autotuning stays in charge. Call before connect() so the TCP
+    window scale is negotiated with the requested sizes.
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if hasattr(socket, "TCP_QUICKACK"):
+        # Linux only; ACK right away instead of waiting to piggyback
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+    if sndbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+
+
+def fill_inbox(sock, limit):
+    """Append up to limit bytes from the server to the inbox"""
+    data = sock.recv(limit)
+    if not data:
+        raise ConnectionError("Connection closed by server")
+    inbox.extend(data)
+
+
+def pop_frame():
+    """Take one complete frame off the inbox; None if it hasn't fully arrived"""
+    if len(inbox) < FRAME_HEADER.size:
+        return None
+    kind, length = FRAME_HEADER.unpack_from(inbox)
+    end = FRAME_HEADER.size + length
+    if len(inbox) < end:
+        return None
+    payload = bytes(inbox[FRAME_HEADER.size:end])
+    del inbox[:end]
+    return kind, payload
+
+
+def recv_frame_header(sock):
+    """Read the next frame header, leaving its payload unread"""
+    # Read only the missing header bytes so the payload can go straight
+    # to its destination
+    while len(inbox) < FRAME_HEADER.size:
+        fill_inbox(sock, FRAME_HEADER.size - len(inbox))
+    kind, length = FRAME_HEADER.unpack_from(inbox)
+    del inbox[:FRAME_HEADER.size]
+    return kind, length
+
+
+def recv_payload_into(sock, view):
+    """Fill view with frame payload: inbox bytes first, then straight from the socket"""
+    got = min(len(inbox), len(view))
+    view[:got] = inbox[:got]
+    del inbox[:got]
+    while got < len(view):
+        n = sock.recv_into(view[got:])
+        if not n:
+            raise ConnectionError("Connection closed by server")
+        got += n
+
+
+def recv_payload(sock, length):
+    """Read a frame payload of the given length"""
+    payload = bytearray(length)
+    recv_payload_into(sock, memoryview(payload))
+    return bytes(payload)
+
+
+def print_text(payload):
+    """Show a text frame (frames never split a character, so each decodes on its own)"""
+    print(payload.decode('utf-8', 'replace'), end='')
+
+
+def recv_reply(sock):
+    """Wait for a control frame, printing chat that arrives before it"""
+    while True:
+        kind, length = recv_frame_header(sock)
+        payload = recv_payload(sock, length)
+        if kind == FRAME_TEXT:
+            print_text(payload)
+        else:
+            return kind, payload
+
+
+def print_frames():
+    """Print every complete frame waiting in the inbox"""
+    while True:
+        frame = pop_frame()
+        if frame is None:
+            return
+        kind, payload = frame
+        if kind == FRAME_TEXT:
+            print_text(payload)
+
+
+def receive_messages(sock, wakeup, notify=None):
+    """Continuously receive and display messages from server.
+    
+    Waits on the server socket and a wakeup socket together, so the main
+    thread can stop the loop (WAKE_STOP) or park it during a file transfer
+    (WAKE_PAUSE) without closing the connection underneath it. When the
+    loop ends, a byte is written to notify so a waiting main loop wakes too.
+    """
+    # Reuse one receive buffer instead of allocating a new bytes per recv
+    buf = bytearray(BUFFER_SIZE)
+    view = memoryview(buf)
+    
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    sel.register(wakeup, selectors.EVENT_READ)
+    
+    try:
+        while not stop.is_set():
+            ready = {key.fileobj for key, _ in sel.select()}
+            
+            # Wakeups first: once a pause is requested, anything else on the
+            # socket belongs to the file transfer
+            if wakeup in ready:
+                signal = wakeup.recv(1)
+                if signal == WAKE_PAUSE:
+                    receiver_paused.set()
+                    receiver_resume.wait()
+                    
+                    # The transfer may have read chat past its last frame
+                    print_frames()
+                    continue
                 break
             
-            message = data.decode('utf-8', 'ignore')
-            print(message, end='')
+            n = sock.recv_into(buf)
+            if not n:
+                raise ConnectionError("Connection closed by server")
             
-        except Exception as e:
-            if running:
-                print(f"\n[ERROR] Receive error: {e}")
-            running = False
-            break
+            # Several messages can arrive in one read; print each complete one
+            inbox.extend(view[:n])
+            print_frames()
+            
+    except ConnectionError:
+        if not stop.is_set():
+            print("\n[DISCONNECTED] Connection lost.")
+    except Exception as e:
+        if not stop.is_set():
+            print(f"\n[ERROR] Receive error: {e}")
+    finally:
+        stop.set()
+        sel.close()
+        if notify is not None:
+            try:
+                notify.send(WAKE_STOP)
+            except OSError:
+                pass
+
+
+def open_input(notify):
+    """Selector over stdin and the receiver's notify socket, or None.
+    
+    None means stdin can't be waited on here (Windows consoles, regular
+    files) and read_line falls back to input().
+    """
+    if sys.platform == "win32":
+        return None
+    sel = selectors.DefaultSelector()
+    try:
+        sel.register(sys.stdin, selectors.EVENT_READ)
+    except (ValueError, OSError):
+        sel.close()
+        return None
+    sel.register(notify, selectors.EVENT_READ)
+    return sel
+
+
+def read_line(sel, pending):
+    """Next line typed by the user, or None once the session has stopped.
+    
+    stdin is read with os.read into pending (not sys.stdin, whose own buffer
+    would hide lines from the selector), so a dropped connection ends the
+    wait at once instead of after the next Enter.
+    """
+    if sel is None:
+        return input()
+    while True:
+        end = pending.find(b"\n")
+        if end >= 0:
+            line = bytes(pending[:end])
+            del pending[:end + 1]
+            return line.decode('utf-8', 'replace').rstrip("\r")
+        if stop.is_set():
+            return None
+        ready = {key.fileobj for key, _ in sel.select()}
+        if sys.stdin in ready:
+            data = os.read(sys.stdin.fileno(), 4096)
+            if not data:
+                if pending:
+                    # Last line without a trailing newline
+                    pending += b"\n"
+                    continue
+                raise EOFError
+            pending += data
+
+
+def pause_receiver(wakeup):
+    """Park the receive thread so the caller can read the socket itself"""
+    receiver_paused.clear()
+    receiver_resume.clear()
+    wakeup.send(WAKE_PAUSE)
+    receiver_paused.wait(timeout=2.0)
+
+
+def resume_receiver():
+    """Let a parked receive thread go back to reading the socket"""
+    receiver_resume.set()
 
 
 def send_message(sock, message):
-    """Send a message to the server"""
+    """Send a message to the server (one line per message)"""
     try:
-        sock.sendall(message.encode())
+        sock.sendall(message.encode() + b"\n")
         return True
     except Exception as e:
         print(f"[ERROR] Send error: {e}")
         return False
 
 
+def show_progress(label, done, total, last_pct):
+    """Print a progress line only when the whole percentage changes; returns it"""
+    pct = done * 100 // total
+    if pct != last_pct:
+        print(f"\r[{label}] Progress: {pct}%", end='')
+    return pct
+
+
+def advise_sequential(f):
+    """Tell the kernel a file will be read front to back (bigger readahead)"""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
 def upload_file(sock, filepath):
     """Upload a file to the server"""
     try:
-        if not os.path.exists(filepath):
+        # Open (and size) the file before anything is sent: once the header
+        # is out the server takes the next filesize bytes as file data
+        try:
+            f = open(filepath, 'rb')
+        except FileNotFoundError:
             print("[ERROR] File not found!")
             return
         
-        filename = os.path.basename(filepath)
-        filesize = os.path.getsize(filepath)
-        
-        # Send upload command
-        send_message(sock, "/upload")
-        
-        # Wait for server ready message
-        response = sock.recv(BUFFER_SIZE).decode('utf-8', 'ignore')
-        if "Ready to receive" not in response:
-            print(f"[ERROR] {response}")
-            return
-        
-        # Send file metadata
-        metadata = f"{filename}|{filesize}"
-        sock.sendall(metadata.encode())
-        
-        # Wait for server acknowledgment
-        ack = sock.recv(BUFFER_SIZE)
-        if ack != b"READY":
-            print("[ERROR] Server not ready for file transfer")
-            return
-        
-        # Send file data
-        print(f"[UPLOAD] Uploading {filename} ({filesize} bytes)...")
-        sent = 0
-        
-        with open(filepath, 'rb') as f:
-            while sent < filesize:
-                chunk = f.read(BUFFER_SIZE)
-                if not chunk:
-                    break
-                sock.sendall(chunk)
-                sent += len(chunk)
-                
-                # Show progress
-                progress = (sent / filesize) * 100
-                print(f"\r[UPLOAD] Progress: {progress:.1f}%", end='')
+        with f:
+            filename = os.path.basename(filepath)
+            filesize = os.fstat(f.fileno()).st_size
+            name = filename.encode()
+            
+            # Command, header and filename in one write; the data follows
+            # immediately without waiting for the server
+            sock.sendall(b"/upload\n" + UPLOAD_HEADER.pack(len(name), filesize) + name)
+            
+            # Send file data
+            print(f"[UPLOAD] Uploading {filename} ({filesize} bytes)...")
+            sent = 0
+            pct = None
+            
+            advise_sequential(f)
+            try:
+                # Zero-copy path: the kernel moves file pages straight to the
+                # socket. Sent in 1 MiB slices so the progress line still moves.
+                while sent < filesize:
+                    n = sock.sendfile(f, sent, min(SENDFILE_CHUNK, filesize - sent))
+                    if not n:
+                        break
+                    sent += n
+                    
+                    # Show progress
+                    pct = show_progress("UPLOAD", sent, filesize, pct)
+            except (AttributeError, OSError):
+                # sendfile unsupported here - continue with a plain read loop
+                f.seek(sent)
+                while sent < filesize:
+                    chunk = f.read(BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    sock.sendall(chunk)
+                    sent += len(chunk)
+                    
+                    # Show progress
+                    pct = show_progress("UPLOAD", sent, filesize, pct)
         
         print()  # New line after progress
         
-        # Wait for server confirmation
-        # (Will be received by the receive_messages thread)
+        # Server confirmation (or error) is printed by the receive_messages thread
         
     except Exception as e:
         print(f"[ERROR] Upload failed: {e}")
 
 
+def recv_file_data(sock, filesize, store, written=None):
+    """Read DATA frames until filesize bytes have arrived.
+    
+    store(offset, length) returns the writable view each payload is received
+    into; written(view) is then called with it, if given. Chat that arrives
+    in between is printed. Returns the bytes received, which is short of
+    filesize if the connection dropped.
+    """
+    received = 0
+    pct = None
+    try:
+        while received < filesize:
+            kind, length = recv_frame_header(sock)
+            if kind == FRAME_TEXT:
+                print_text(recv_payload(sock, length))
+                continue
+            if kind != FRAME_DATA or received + length > filesize:
+                raise ConnectionError(f"Unexpected frame {kind!r} during download")
+            
+            chunk = store(received, length)
+            recv_payload_into(sock, chunk)
+            if written:
+                written(chunk)
+            received += length
+            
+            # Show progress
+            pct = show_progress("DOWNLOAD", received, filesize, pct)
+    except ConnectionError:
+        pass
+    return received
+
+
+def recv_file_mmap(sock, f, filesize):
+    """Receive filesize bytes directly into a memory map of the open file.
+    
+    Returns the number of bytes received, or None if the file cannot be
+    mapped (empty file, unsupported platform/filesystem, no room for it).
+    """
+    try:
+        # A full disk under a sparse mapping kills the process with SIGBUS
+        # instead of raising OSError, so the blocks are reserved up front.
+        # Windows allocates them when the file is extended; elsewhere,
+        # without posix_fallocate, the buffered path is used instead
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(f.fileno(), 0, filesize)
+        elif os.name != "nt":
+            return None
+        f.truncate(filesize)
+        mm = mmap.mmap(f.fileno(), filesize)
+    except (OSError, ValueError):
+        return None
+    
+    with mm:
+        view = memoryview(mm)
+        try:
+            return recv_file_data(sock, filesize, lambda offset, length: view[offset:offset + length])
+        finally:
+            view.release()
+
+
+def recv_file_buffered(sock, f, filesize):
+    """Receive filesize bytes through a preallocated buffer into f"""
+    f.seek(0)
+    
+    # Preallocated buffer: recv_into fills it in place, no per-chunk bytes.
+    # DATA frames can be larger than BUFFER_SIZE, so the first larger one
+    # grows it once and later frames reuse the bigger buffer
+    view = memoryview(bytearray(BUFFER_SIZE))
+    
+    def store(offset, length):
+        nonlocal view
+        if length > len(view):
+            view = memoryview(bytearray(length))
+        return view[:length]
+    
+    return recv_file_data(sock, filesize, store, f.write)
+
+
 def download_file(sock, filename, save_dir="downloads"):
     """Download a file from the server"""
     try:
@@ -105,47 +423,32 @@ def download_file(sock, filename, save_dir="downloads"):
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
         
-        # Send download command
-        send_message(sock, "/download")
-        
-        # Send filename immediately (no prompt from server)
-        sock.sendall(filename.encode())
+        # Send download command and filename together (no prompt from server)
+        send_message(sock, f"/download\n{filename}")
         
         # Receive response
-        response = sock.recv(BUFFER_SIZE).decode('utf-8', 'ignore')
-        
-        if response.startswith("ERROR"):
-            print(f"[ERROR] {response.split('|')[1]}")
+        kind, payload = recv_reply(sock)
+        if kind == FRAME_ERROR:
+            print(f"[ERROR] {payload.decode('utf-8', 'replace')}")
             return
-        
-        # Parse file size
-        parts = response.split('|')
-        if parts[0] != "OK":
-            print("[ERROR] Invalid server response")
+        if kind != FRAME_READY:
+            print(f"[ERROR] Unexpected server reply: {kind!r}")
             return
         
-        filesize = int(parts[1])
-        
-        # Send ready acknowledgment
-        sock.sendall(b"READY")
+        # READY carries the file size; DATA frames follow
+        filesize, _ = FILE_INFO.unpack(payload)
         
         # Receive file data
         filepath = os.path.join(save_dir, filename)
-        received = 0
         
         print(f"[DOWNLOAD] Downloading {filename} ({filesize} bytes)...")
         
-        with open(filepath, 'wb') as f:
-            while received < filesize:
-                chunk = sock.recv(min(BUFFER_SIZE, filesize - received))
-                if not chunk:
-                    break
-                f.write(chunk)
-                received += len(chunk)
-                
-                # Show progress
-                progress = (received / filesize) * 100
-                print(f"\r[DOWNLOAD] Progress: {progress:.1f}%", end='')
+        with open(filepath, 'w+b') as f:
+            # Receive straight into a memory map of the destination file;
+            # fall back to a reusable buffer + write when it can't be mapped
+            received = recv_file_mmap(sock, f, filesize)
+            if received is None:
+                received = recv_file_buffered(sock, f, filesize)
         
         print()  # New line after progress
         
@@ -162,14 +465,20 @@ def download_file(sock, filename, save_dir="downloads"):
 
 def main():
     """Main client function"""
-    import argparse
+    global BUFFER_SIZE
     
     ap = argparse.ArgumentParser(description="Chat Client with File Sharing")
     ap.add_argument("--host", default="127.0.0.1", help="Server host address")
     ap.add_argument("--port", type=int, default=5000, help="Server port")
+    ap.add_argument("--bufsize", type=int, default=BUFFER_SIZE,
+                    help="Chunk size for socket reads and file transfers")
+    ap.add_argument("--sndbuf", type=int, default=None,
+                    help="Kernel send buffer size (default: OS autotuning)")
+    ap.add_argument("--rcvbuf", type=int, default=None,
+                    help="Kernel receive buffer size (default: OS autotuning)")
     args = ap.parse_args()
     
-    global running
+    BUFFER_SIZE = args.bufsize
     
     print("=" * 60)
     print("  DISTRIBUTED CHAT CLIENT")
@@ -181,26 +490,32 @@ def main():
     try:
         # Connect to server
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tune_socket(sock, args.sndbuf, args.rcvbuf)
         sock.connect((args.host, args.port))
         print("[CONNECTED] Successfully connected to server!\n")
         
-        # Start receive thread
-        receive_thread = threading.Thread(target=receive_messages, args=(sock,), daemon=True)
+        # Start receive thread; wakeup_w is how we stop or pause it, and
+        # notify_r tells the input loop when it has ended
+        wakeup_r, wakeup_w = socket.socketpair()
+        notify_r, notify_w = socket.socketpair()
+        receive_thread = threading.Thread(target=receive_messages, args=(sock, wakeup_r, notify_w), daemon=True)
         receive_thread.start()
         
+        input_sel = open_input(notify_r)
+        typed = bytearray()
+        
         # Wait a moment for initial server messages
-        import time
         time.sleep(0.5)
         
         # Main input loop
         print("\nYou can start typing messages or use commands.")
         print("Type /help to see available commands.\n")
         
-        while running:
+        while not stop.is_set():
             try:
-                message = input()
+                message = read_line(input_sel, typed)
                 
-                if not running:
+                if message is None or stop.is_set():
                     break
                 
                 if not message.strip():
@@ -213,7 +528,11 @@ def main():
                 
                 elif message.startswith("/download "):
                     filename = message[10:].strip()
-                    download_file(sock, filename)
+                    pause_receiver(wakeup_w)
+                    try:
+                        download_file(sock, filename)
+                    finally:
+                        resume_receiver()
                 
                 else:
                     # Send regular message or command
@@ -221,7 +540,7 @@ def main():
                         break
                     
                     if message == "/quit":
-                        running = False
+                        stop.set()
                         break
                         
             except EOFError:
@@ -231,9 +550,16 @@ def main():
                 send_message(sock, "/quit")
                 break
         
-        # Cleanup
-        running = False
+        # Cleanup: wake the receiver so it exits before the socket goes away
+        stop.set()
+        wakeup_w.send(WAKE_STOP)
+        resume_receiver()
+        receive_thread.join(timeout=2.0)
         sock.close()
+        if input_sel is not None:
+            input_sel.close()
+        for s in (wakeup_r, wakeup_w, notify_r, notify_w):
+            s.close()
         print("\n[DISCONNECTED] Connection closed.")
         
     except ConnectionRefusedError:
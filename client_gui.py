@@ -3,18 +3,140 @@ GUI Chat Client with File Sharing
 Tkinter-based graphical interface for better user experience
 """
 
+import argparse
 import socket
 import threading
+import queue
+import selectors
+import re
+import struct
+import zlib
 import tkinter as tk
 from tkinter import scrolledtext, filedialog, messagebox, ttk
 import os
 
-BUFFER_SIZE = 4096
+BUFFER_SIZE = 65536
+FILE_CHUNK = 1024 * 1024  # File read/write size, independent of the frames on the wire
+PARALLEL_STREAMS = 4  # Connections used for one large download
+PARALLEL_THRESHOLD = 16 * 1024 * 1024  # Smaller downloads use the chat connection
+DISPLAY_QUEUE_SIZE = 1024  # Messages waiting for the chat area before the receiver blocks
+DOWNLOAD_DIR = "downloads"
+MAX_CHAT_LINES = 2000  # Older lines are dropped so the chat area stays cheap to lay out
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)  # Per-call non-blocking recv (not on Windows)
+
+# Everything the server sends is a frame: kind byte + payload length + payload
+FRAME_HEADER = struct.Struct("!cI")
+FRAME_TEXT = b"T"   # chat and notifications (UTF-8)
+FRAME_READY = b"R"  # download accepted; payload is the file size and CRC-32
+FRAME_ERROR = b"E"  # download refused; payload is the error message
+FRAME_DATA = b"D"   # a piece of the file being downloaded
+FILE_INFO = struct.Struct("!QI")
+
+# Sent right after /upload: filename length and file size, then the filename
+UPLOAD_HEADER = struct.Struct("!HQ")
+
+# First line of a side connection that fetches part of a file (instead of a username)
+RANGE_COMMAND = "/download_range"
+
+# Markers that pick a chat color tag, found in one scan per message.
+# When several match, the lowest rank wins (errors before success, ...).
+TAG_PATTERN = re.compile(r"\[(ERROR|SUCCESS|FILE|DOWNLOAD|UPLOAD)\]|DISCONNECTED|uploaded|\*[^\n]*?(joined|left)")
+TAG_RANKS = {
+    "ERROR": (0, 'error'), "DISCONNECTED": (0, 'error'),
+    "SUCCESS": (1, 'success'), "uploaded": (1, 'success'),
+    "FILE": (2, 'file'), "DOWNLOAD": (2, 'file'), "UPLOAD": (2, 'file'),
+    "joined": (3, 'join'),
+    "left": (4, 'leave'),
+}
+
+
+def pop_frame(inbox):
+    """Take one complete frame off the inbox; None if it hasn't fully arrived"""
+    if len(inbox) < FRAME_HEADER.size:
+        return None
+    kind, length = FRAME_HEADER.unpack_from(inbox)
+    end = FRAME_HEADER.size + length
+    if len(inbox) < end:
+        return None
+    payload = bytes(inbox[FRAME_HEADER.size:end])
+    del inbox[:end]
+    return kind, payload
+
+
+def recv_frame_header(sock, inbox):
+    """Read the next frame header, leaving its payload in the inbox or unread"""
+    # Read ahead: one recv brings in the header together with the start of
+    # its payload (or several short text frames), instead of a 5-byte recv
+    # per frame
+    while len(inbox) < FRAME_HEADER.size:
+        data = sock.recv(BUFFER_SIZE)
+        if not data:
+            raise ConnectionError("Connection closed by server")
+        inbox += data
+    kind, length = FRAME_HEADER.unpack_from(inbox)
+    del inbox[:FRAME_HEADER.size]
+    return kind, length
+
+
+def recv_payload_into(sock, inbox, view):
+    """Fill view with frame payload: inbox bytes first, then straight from the socket"""
+    got = min(len(inbox), len(view))
+    view[:got] = inbox[:got]
+    del inbox[:got]
+    while got < len(view):
+        n = sock.recv_into(view[got:])
+        if not n:
+            raise ConnectionError("Connection closed by server")
+        got += n
+
+
+def recv_payload(sock, inbox, length):
+    """Read a frame payload of the given length"""
+    payload = bytearray(length)
+    recv_payload_into(sock, inbox, memoryview(payload))
+    return bytes(payload)
+
+
+def advise_sequential(f):
+    """Tell the kernel a file will be read front to back (bigger readahead)"""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def tune_socket(sock, sndbuf=None, rcvbuf=None):
+    """Disable Nagle and delayed ACKs, and optionally size the kernel socket buffers.
+    
+    Buffer sizes are only applied when given explicitly, so by default the
+    kernel's autotuning stays in charge. Call before connect() so the TCP
+    window scale is negotiated with the requested sizes.
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if hasattr(socket, "TCP_QUICKACK"):
+        # Linux only; ACK right away instead of waiting to piggyback
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+    if sndbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+
+
+def preallocate(fd, size):
+    """Reserve size bytes for a file up front so the writes never extend it"""
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        # Not on this platform or filesystem; at least set the final size
+        os.ftruncate(fd, size)
 
 
 class ChatClientGUI:
-    def __init__(self, root):
+    def __init__(self, root, sndbuf=None, rcvbuf=None):
         self.root = root
+        self.sndbuf = sndbuf  # Kernel buffer sizes; None leaves them to autotuning
+        self.rcvbuf = rcvbuf
         self.root.title("Distributed Chat Client")
         self.root.geometry("960x620")
         self.root.minsize(820, 540)
@@ -32,12 +154,33 @@ class ChatClientGUI:
         self.join_color = "#22c55e"  # green-500
         self.leave_color = "#f97316"  # orange-400
 
+        # Chat message tags, configured once on the chat area; the legend
+        # swatches reuse the same colors
+        bold = ("Consolas", 10, "bold")
+        self.tag_specs = {
+            "error": {"foreground": self.error_color},
+            "success": {"foreground": self.success_color},
+            "file": {"foreground": self.file_color},
+            "join": {"foreground": self.join_color, "font": bold},
+            "leave": {"foreground": self.leave_color, "font": bold},
+        }
+
         self.root.configure(bg=self.bg_main)
 
         self.sock = None
+        self.server_addr = None
         self.running = False
         self.username = ""
-        self.receive_lock = threading.Lock()  # Lock for coordinating file operations
+        self.outbox = queue.SimpleQueue()  # Everything written to the socket goes through here
+        self.sender_thread = None
+        self.reader_jobs = queue.SimpleQueue()  # File operations that need the server's replies
+        self._inbox = bytearray()  # Received bytes not yet consumed as frames
+        self._wakeup_r = None  # socketpair that wakes the receive thread for reader_jobs
+        self._wakeup_w = None
+        self._pending = queue.Queue(maxsize=DISPLAY_QUEUE_SIZE)  # (message, tag) waiting for the next chat flush
+        self._flush_scheduled = False
+        self._downloads_ready = False  # DOWNLOAD_DIR is known to exist
+        self.parallel_streams = PARALLEL_STREAMS if hasattr(os, "pwrite") else 1
 
         self.create_connection_frame()
         
@@ -247,6 +390,10 @@ class ChatClientGUI:
         )
         self.chat_area.pack(expand=True, fill="both")
 
+        # Message color tags (configured once, reused by every insert)
+        for tag, spec in self.tag_specs.items():
+            self.chat_area.tag_config(tag, **spec)
+
         # Right: quick help / legend
         side_panel = tk.Frame(
             content_frame,
@@ -257,14 +404,6 @@ class ChatClientGUI:
         )
         side_panel.pack(side="right", fill="y", padx=(8, 0))
 
-        tk.Label(
-            side_panel,
-            text="Commands",
-            font=("Segoe UI", 10, "bold"),
-            bg=self.bg_panel,
-            fg=self.fg_primary,
-        ).pack(anchor="w", pady=(0, 4))
-
         commands_text = (
             "/users  - list online users\n"
             "/files  - list shared files\n"
@@ -273,40 +412,39 @@ class ChatClientGUI:
             "/quit   - leave chat"
         )
 
-        tk.Label(
+        legend_items = [
+            ("System / errors", "error"),
+            ("Uploads / downloads", "file"),
+            ("Join / leave", "join"),
+        ]
+
+        # Commands and legend live in one read-only Text widget (tags for the
+        # headings and color swatches) instead of a frame and labels per row
+        side_text = tk.Text(
             side_panel,
-            text=commands_text,
+            width=26,
+            height=11,
             font=("Segoe UI", 9),
-            justify="left",
             bg=self.bg_panel,
             fg=self.fg_muted,
-        ).pack(anchor="w")
-
-        tk.Label(
-            side_panel,
-            text="Legend",
-            font=("Segoe UI", 10, "bold"),
-            bg=self.bg_panel,
-            fg=self.fg_primary,
-        ).pack(anchor="w", pady=(12, 4))
-
-        legend_items = [
-            ("System / errors", self.error_color),
-            ("Uploads / downloads", self.file_color),
-            ("Join / leave", self.join_color),
-        ]
+            borderwidth=0,
+            highlightthickness=0,
+            wrap="none",
+            cursor="arrow",
+        )
+        side_text.pack(anchor="w", fill="y")
+        side_text.tag_config("heading", font=("Segoe UI", 10, "bold"), foreground=self.fg_primary, spacing3=4)
+        side_text.tag_config("section", spacing1=12)
 
-        for text, color in legend_items:
-            row = tk.Frame(side_panel, bg=self.bg_panel)
-            row.pack(anchor="w", pady=1)
-            tk.Label(row, width=2, bg=color).pack(side="left", padx=(0, 6))
-            tk.Label(
-                row,
-                text=text,
-                font=("Segoe UI", 9),
-                bg=self.bg_panel,
-                fg=self.fg_muted,
-            ).pack(side="left")
+        side_text.insert(tk.END, "Commands\n", "heading")
+        side_text.insert(tk.END, commands_text + "\n")
+        side_text.insert(tk.END, "Legend\n", ("heading", "section"))
+        for text, tag in legend_items:
+            swatch = f"swatch_{tag}"
+            side_text.tag_config(swatch, background=self.tag_specs[tag]["foreground"])
+            side_text.insert(tk.END, "    ", swatch)
+            side_text.insert(tk.END, f"  {text}\n")
+        side_text.config(state="disabled")
 
         # Message input area
         input_frame = tk.Frame(self.chat_frame, bg=self.bg_main, pady=6)
@@ -364,7 +502,10 @@ class ChatClientGUI:
             
             # Create socket and connect
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.connect((host, port))
+            tune_socket(self.sock, self.sndbuf, self.rcvbuf)
+            self.server_addr = (host, port)
+            self.sock.connect(self.server_addr)
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
             
             self.running = True
             
@@ -372,10 +513,12 @@ class ChatClientGUI:
             self.conn_frame.destroy()
             self.create_chat_frame()
             
-            # Wait for server prompt and send username
-            import time
-            time.sleep(0.2)
-            self.sock.sendall(self.username.encode())
+            # Single writer thread owns all sends on the socket
+            self.sender_thread = threading.Thread(target=self.send_loop, daemon=True)
+            self.sender_thread.start()
+            
+            # Username is the first line; the server buffers it until it asks
+            self.send_line(self.username)
             
             # NOW start receive thread (after chat_area exists)
             receive_thread = threading.Thread(target=self.receive_messages, daemon=True)
@@ -394,69 +537,205 @@ class ChatClientGUI:
             self.status_label.config(text="Connection failed", fg="red")
     
     def receive_messages(self):
-        """Continuously receive messages from server"""
-        while self.running:
-            try:
-                # Try to acquire lock with timeout - if file operation is in progress, skip
-                if self.receive_lock.acquire(blocking=False):
-                    try:
-                        self.sock.settimeout(1.0)  # Use timeout to allow clean shutdown
-                        data = self.sock.recv(BUFFER_SIZE)
-                        
-                        if not data:
-                            self.running = False
-                            self.display_message("\n[DISCONNECTED] Connection lost.\n", 'red')
+        """Sole reader on the socket: display chat and run queued reader jobs.
+        
+        Waits on the socket and a wakeup socket together. Each wakeup byte
+        announces one item in reader_jobs: a callable taking the socket (a
+        file operation reading the server's replies) or None to stop.
+        """
+        # Reuse one receive buffer instead of allocating a new bytes per recv
+        buf = bytearray(BUFFER_SIZE)
+        view = memoryview(buf)
+        
+        sel = selectors.DefaultSelector()
+        sel.register(self.sock, selectors.EVENT_READ)
+        sel.register(self._wakeup_r, selectors.EVENT_READ)
+        
+        try:
+            while self.running:
+                ready = {key.fileobj for key, _ in sel.select()}
+                
+                # Chat first: a job sends its own command, so whatever is
+                # already waiting on the socket is not a reply to it
+                if self.sock in ready:
+                    n = self.sock.recv_into(buf)
+                    if not n:
+                        self.running = False
+                        self.display_message("\n[DISCONNECTED] Connection lost.\n", 'red')
+                        break
+                    
+                    self._inbox.extend(view[:n])
+                    
+                    # A full buffer means more is already waiting: drain it before
+                    # showing anything. MSG_DONTWAIT keeps the shared socket in
+                    # blocking mode for the sender thread.
+                    while n == len(buf) and MSG_DONTWAIT:
+                        try:
+                            n = self.sock.recv_into(buf, 0, MSG_DONTWAIT)
+                        except BlockingIOError:
                             break
-                        
-                        message = data.decode('utf-8', 'ignore')
-                        self.display_message(message)
-                    finally:
-                        self.receive_lock.release()
-                else:
-                    # Lock is held by file operation, wait a bit
-                    import time
-                    time.sleep(0.1)
+                        self._inbox.extend(view[:n])
+                    
+                    # Several messages can arrive in one read; show each complete one
+                    self._show_frames()
                 
-            except socket.timeout:
-                # Timeout is normal, just continue
-                continue
-            except Exception as e:
-                if self.running:
-                    self.display_message(f"\n[ERROR] {e}\n", 'red')
-                self.running = False
-                break
+                if self._wakeup_r in ready:
+                    self._wakeup_r.recv(1)
+                    job = self.reader_jobs.get()
+                    if job is None:
+                        break
+                    job(self.sock)
+                    
+                    # The job may have read chat past its last frame
+                    self._show_frames()
+                
+        except Exception as e:
+            if self.running:
+                self.display_message(f"\n[ERROR] {e}\n", 'red')
+            self.running = False
+        finally:
+            sel.close()
+    
+    def _show_frames(self):
+        """Display every complete text frame waiting in the inbox"""
+        while True:
+            frame = pop_frame(self._inbox)
+            if frame is None:
+                return
+            kind, payload = frame
+            if kind == FRAME_TEXT:
+                # Frames never split a character, so no bytes are lost here
+                self.display_message(payload.decode('utf-8', 'replace'))
+    
+    def _recv_reply(self, sock):
+        """Wait for a control frame, displaying chat that arrives before it"""
+        while True:
+            kind, length = recv_frame_header(sock, self._inbox)
+            payload = recv_payload(sock, self._inbox, length)
+            if kind == FRAME_TEXT:
+                self.display_message(payload.decode('utf-8', 'replace'))
+            else:
+                return kind, payload
     
     def display_message(self, message, color='black'):
-        """Display message in chat area"""
+        """Queue a message for the chat area; safe to call from any thread.
+        
+        Messages are written in batches by _flush_pending on the Tk thread,
+        at most once per frame (16 ms), instead of one Tk round trip each.
+        The queue is bounded: a worker thread blocks when the GUI falls
+        behind, which stops it reading and lets TCP push back on the server.
+        """
+        # Add color tags for different message types
+        _, tag = min(
+            (TAG_RANKS[m.group(1) or m.group(2) or m.group(0)] for m in TAG_PATTERN.finditer(message)),
+            default=(None, None),
+        )
+        
+        if threading.current_thread() is threading.main_thread():
+            # The Tk thread is the consumer; it must never wait on a full queue
+            while True:
+                try:
+                    self._pending.put_nowait((message, tag))
+                    break
+                except queue.Full:
+                    self._flush_pending()
+        else:
+            self._pending.put((message, tag))
+        
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            try:
+                self.root.after(16, self._flush_pending)
+            except RuntimeError:
+                # Tk is gone (window closed while a worker was still running)
+                pass
+    
+    def _flush_pending(self):
+        """Write all queued messages to the chat area in one batch"""
+        self._flush_scheduled = False
+        
         # Safety check: ensure chat_area exists
         if not hasattr(self, 'chat_area') or self.chat_area is None:
             return
         
         self.chat_area.config(state='normal')
+        while True:
+            try:
+                message, tag = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if tag:
+                self.chat_area.insert(tk.END, message, tag)
+            else:
+                self.chat_area.insert(tk.END, message)
         
-        # Add color tags for different message types
-        if '[ERROR]' in message or 'DISCONNECTED' in message:
-            self.chat_area.insert(tk.END, message, 'error')
-        elif '[SUCCESS]' in message or 'uploaded' in message:
-            self.chat_area.insert(tk.END, message, 'success')
-        elif '[FILE]' in message or '[DOWNLOAD]' in message or '[UPLOAD]' in message:
-            self.chat_area.insert(tk.END, message, 'file')
-        elif '*' in message and 'joined' in message:
-            self.chat_area.insert(tk.END, message, 'join')
-        elif '*' in message and 'left' in message:
-            self.chat_area.insert(tk.END, message, 'leave')
-        else:
-            self.chat_area.insert(tk.END, message)
-        
+        # Keep only the newest lines; checked once per batch, not per message
+        lines = int(self.chat_area.index('end-1c').split('.')[0])
+        if lines > MAX_CHAT_LINES:
+            self.chat_area.delete('1.0', f'{lines - MAX_CHAT_LINES + 1}.0')
         self.chat_area.config(state='disabled')
         self.chat_area.see(tk.END)
+    
+    def send_loop(self):
+        """Sole writer on the socket: send queued items in FIFO order.
+        
+        Items are bytes, or callables taking the socket (used to stream file
+        payloads in order with chat traffic). None stops the loop.
+        """
+        while True:
+            item = self.outbox.get()
+            if item is None:
+                break
+            try:
+                if callable(item):
+                    item(self.sock)
+                else:
+                    self.sock.sendall(item)
+            except Exception as e:
+                if self.running:
+                    self.display_message(f"\n[ERROR] Send failed: {e}\n", 'red')
+    
+    def send(self, data):
+        """Queue bytes or a job(sock) for the sender thread (never blocks the caller)"""
+        self.outbox.put(data)
+    
+    def send_line(self, text):
+        """Queue one newline-terminated command or chat message"""
+        self.outbox.put(text.encode() + b"\n")
+    
+    def run_on_receiver(self, job):
+        """Queue job(sock) to run on the receive thread, between chat reads.
         
-        # Configure tags
-        self.chat_area.tag_config('error', foreground=self.error_color)
-        self.chat_area.tag_config('success', foreground=self.success_color)
-        self.chat_area.tag_config('file', foreground=self.file_color)
-        self.chat_area.tag_config('join', foreground=self.join_color, font=('Consolas', 10, 'bold'))
-        self.chat_area.tag_config('leave', foreground=self.leave_color, font=('Consolas', 10, 'bold'))
+        The write side needs no helper: send() takes the same kind of job.
+        """
+        if not self.running:
+            self.display_message("[ERROR] Not connected to server\n", 'red')
+            return
+        self.reader_jobs.put(job)
+        self._wakeup_w.send(b"\0")
+    
+    def disconnect(self):
+        """Stop the receive thread, flush pending sends and close the socket"""
+        self.running = False
+        if self._wakeup_w is not None:
+            try:
+                self.reader_jobs.put(None)
+                self._wakeup_w.send(b"\0")
+            except OSError:
+                pass
+        if self.sender_thread is not None:
+            self.outbox.put(None)
+            self.sender_thread.join(timeout=2.0)
+        if self.sock:
+            try:
+                # Unblock a reader job still waiting on the server
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                self.sock.close()
+            except:
+                pass
     
     def send_message(self):
         """Send message to server"""
@@ -465,30 +744,22 @@ class ChatClientGUI:
         if not message:
             return
         
-        try:
-            self.sock.sendall(message.encode())
-            self.message_entry.delete(0, tk.END)
-            
-            if message == "/quit":
-                self.running = False
-                self.sock.close()
-                self.root.destroy()
-                
-        except Exception as e:
-            self.display_message(f"\n[ERROR] Send failed: {e}\n", 'red')
+        self.send_line(message)
+        self.message_entry.delete(0, tk.END)
+        
+        if message == "/quit":
+            self.disconnect()
+            self.root.destroy()
     
     def show_users(self):
         """Request and display user list"""
-        try:
-            self.sock.sendall(b"/users")
-        except Exception as e:
-            self.display_message(f"\n[ERROR] {e}\n", 'red')
+        self.send_line("/users")
     
     def show_files(self):
         """Show available files and download options"""
         try:
             # Request file list
-            self.sock.sendall(b"/files")
+            self.send_line("/files")
             
             # Create file dialog
             file_window = tk.Toplevel(self.root)
@@ -531,201 +802,298 @@ class ChatClientGUI:
         if not filepath:
             return
         
-        # Run upload in a separate thread to avoid blocking GUI
-        upload_thread = threading.Thread(target=self._upload_file_thread, args=(filepath,), daemon=True)
-        upload_thread.start()
-    
-    def _upload_file_thread(self, filepath):
-        """Thread function to handle file upload"""
-        import time
         try:
             filename = os.path.basename(filepath)
-            filesize = os.path.getsize(filepath)
+            filesize = os.stat(filepath).st_size
+            name = filename.encode()
             
-            # Use lock to serialize socket access
-            with self.receive_lock:
-                # Temporarily set socket to blocking mode with longer timeout
-                self.sock.settimeout(30.0)
-                
-                # Send upload command
-                self.sock.sendall(b"/upload")
-                
-                # Wait for server ready message
-                ready_msg = self.sock.recv(BUFFER_SIZE)
-                
-                # Check if server is ready
-                if b"Ready to receive" not in ready_msg:
-                    self.display_message(f"[ERROR] Unexpected response: {ready_msg.decode()}\n", 'red')
-                    self.sock.settimeout(1.0)
-                    return
-                
-                # Send file metadata
-                metadata = f"{filename}|{filesize}"
-                self.sock.sendall(metadata.encode())
-                
-                # Wait for acknowledgment
-                ack = self.sock.recv(BUFFER_SIZE)
-                if ack != b"READY":
-                    self.display_message("[ERROR] Server not ready for transfer\n", 'red')
-                    self.sock.settimeout(1.0)
-                    return
-                
-                # Send file data
-                self.display_message(f"[UPLOAD] Uploading {filename} ({filesize} bytes)...\n", 'blue')
-                
-                sent = 0
-                with open(filepath, 'rb') as f:
-                    while sent < filesize:
-                        chunk = f.read(BUFFER_SIZE)
-                        if not chunk:
-                            break
-                        self.sock.sendall(chunk)
-                        sent += len(chunk)
-                
-                # Wait for confirmation
-                try:
-                    confirmation = self.sock.recv(BUFFER_SIZE).decode('utf-8', 'ignore')
-                    self.display_message(confirmation)
-                except socket.timeout:
-                    self.display_message("[INFO] Upload sent, waiting for server confirmation...\n", 'blue')
-                
-                # Restore timeout for receive loop
-                self.sock.settimeout(1.0)
+            self.display_message(f"[UPLOAD] Uploading {filename} ({filesize} bytes)...\n", 'blue')
+            
+            # No handshake: command, header and filename, then the payload
+            # streamed on the sender thread in order with chat sends. The
+            # server's confirmation is displayed by the receive loop.
+            header = b"/upload\n" + UPLOAD_HEADER.pack(len(name), filesize) + name
+            self.send(lambda sock: self._send_file_data(sock, header, filepath, filesize))
             
-        except socket.timeout as e:
-            self.display_message(f"\n[ERROR] Upload failed: Connection timeout. Server may be busy.\n", 'red')
-            try:
-                self.sock.settimeout(1.0)
-            except:
-                pass
         except Exception as e:
             self.display_message(f"\n[ERROR] Upload failed: {e}\n", 'red')
+    
+    def _send_file_data(self, sock, header, filepath, filesize):
+        """Send an upload header and the file behind it; runs on the sender thread"""
+        with open(filepath, 'rb') as f:
+            advise_sequential(f)
+            
+            # The header leaves in the same send as the start of the file, not
+            # as a tiny segment of its own (small files go out in one send)
+            first = f.read(min(BUFFER_SIZE, filesize))
+            sock.sendall(header + first)
+            sent = len(first)
+            
             try:
-                self.sock.settimeout(1.0)
-            except:
-                pass
+                # Zero-copy: kernel sendfile(2) instead of read + sendall
+                if sent < filesize:
+                    sent += sock.sendfile(f, sent, filesize - sent)
+            except (AttributeError, OSError):
+                # sendfile unsupported here - fall back to a read loop over
+                # one reused 1 MiB buffer (few large sendall calls). sendfile
+                # leaves the file position after the last byte it sent, so
+                # resume there instead of sending the start twice.
+                sent = f.tell()
+                buf = bytearray(min(FILE_CHUNK, max(filesize, 1)))
+                view = memoryview(buf)
+                while sent < filesize:
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    sock.sendall(view[:n])
+                    sent += n
+        return sent
     
     def download_file(self, filename):
         """Download a file from server"""
-        # Run download in a separate thread to avoid blocking GUI
-        download_thread = threading.Thread(target=self._download_file_thread, args=(filename,), daemon=True)
-        download_thread.start()
+        if self.parallel_streams > 1:
+            # Large files come in over side connections; the thread falls
+            # back to the chat connection for small ones
+            threading.Thread(target=self._download_parallel_thread, args=(filename,), daemon=True).start()
+            return
+        # Runs on the receive thread so the server's replies are read in order
+        # with chat, without blocking the GUI
+        self.run_on_receiver(lambda sock: self._download_file_thread(sock, filename))
+    
+    def _download_path(self, filename):
+        """Where to save a download; creates DOWNLOAD_DIR on first use only"""
+        if not self._downloads_ready:
+            os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+            self._downloads_ready = True
+        return os.path.join(DOWNLOAD_DIR, filename)
     
-    def _download_file_thread(self, filename):
-        """Thread function to handle file download"""
-        import time
-        save_dir = "downloads"
+    def _fetch_range(self, filename, offset, length, fd=None):
+        """Fetch length bytes at offset over a new connection.
+        
+        The bytes are written to fd at the same offset. A length of 0 only
+        asks for the file's size and CRC-32, which are returned either way.
+        Raises ConnectionError with the server's message if it refuses.
+        """
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            tune_socket(sock, self.sndbuf, self.rcvbuf)
+            sock.settimeout(30)
+            sock.connect(self.server_addr)
+            sock.sendall(f"{RANGE_COMMAND} {filename} {offset} {length}\n".encode())
+            
+            inbox = bytearray()
+            while True:
+                # Skip the name prompt every connection starts with
+                kind, size = recv_frame_header(sock, inbox)
+                payload = recv_payload(sock, inbox, size)
+                if kind == FRAME_ERROR:
+                    raise ConnectionError(payload.decode('utf-8', 'replace'))
+                if kind == FRAME_READY:
+                    break
+            filesize, crc = FILE_INFO.unpack(payload)
+            
+            # Same buffering as the single-connection download
+            buf = bytearray(min(FILE_CHUNK, max(length, 1)))
+            view = memoryview(buf)
+            filled = 0
+            received = 0
+            length = min(length, filesize - offset)
+            while received < length:
+                kind, size = recv_frame_header(sock, inbox)
+                if kind != FRAME_DATA or received + size > length:
+                    raise ConnectionError(f"Unexpected frame {kind!r} during download")
+                if filled + size > len(buf):
+                    os.pwrite(fd, view[:filled], offset + received - filled)
+                    filled = 0
+                recv_payload_into(sock, inbox, view[filled:filled + size])
+                filled += size
+                received += size
+            if filled:
+                os.pwrite(fd, view[:filled], offset + received - filled)
+        return filesize, crc
+    
+    def _download_parallel_thread(self, filename):
+        """Download a large file over parallel_streams connections at once"""
+        try:
+            filesize, expected_crc = self._fetch_range(filename, 0, 0)
+        except ConnectionError as e:
+            self.display_message(f"[ERROR] {e}\n", 'red')
+            return
+        except Exception as e:
+            self.display_message(f"\n[ERROR] Download failed: {e}\n", 'red')
+            return
+        
+        if filesize <= PARALLEL_THRESHOLD:
+            self.run_on_receiver(lambda sock: self._download_file_thread(sock, filename))
+            return
+        
+        streams = self.parallel_streams
+        self.display_message(
+            f"[DOWNLOAD] Downloading {filename} ({filesize} bytes) over {streams} connections...\n", 'blue'
+        )
+        
+        # Equal ranges; the last one also takes the remainder
+        part = filesize // streams
+        ranges = [(i * part, part if i < streams - 1 else filesize - i * part) for i in range(streams)]
+        errors = []
+        
+        try:
+            filepath = self._download_path(filename)
+            fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        except OSError as e:
+            self.display_message(f"\n[ERROR] Download failed: {e}\n", 'red')
+            return
+        
+        def fetch(offset, length):
+            try:
+                self._fetch_range(filename, offset, length, fd)
+            except Exception as e:
+                errors.append(e)
         
         try:
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
+            preallocate(fd, filesize)
             
+            workers = [threading.Thread(target=fetch, args=r, daemon=True) for r in ranges]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            os.close(fd)
+        
+        # A failed range leaves a hole in a file that is already full size,
+        # so it is removed rather than left looking complete
+        if errors:
+            os.remove(filepath)
+            self.display_message(f"\n[ERROR] Download failed: {errors[0]}\n", 'red')
+            return
+        
+        # The ranges arrive out of order, so the checksum is taken in one
+        # pass over the finished file (still in the page cache)
+        try:
+            crc = 0
+            with open(filepath, 'rb') as f:
+                advise_sequential(f)
+                while True:
+                    chunk = f.read(FILE_CHUNK)
+                    if not chunk:
+                        break
+                    crc = zlib.crc32(chunk, crc)
+        except OSError as e:
+            self.display_message(f"\n[ERROR] Download failed: {e}\n", 'red')
+            return
+        if crc != expected_crc:
+            os.remove(filepath)
+            self.display_message(f"[ERROR] {filename} arrived corrupted (checksum mismatch); discarded\n", 'red')
+            return
+        
+        self.display_message(f"[SUCCESS] Downloaded {filename} to {filepath}\n", 'green')
+        self.root.after(0, lambda f=filepath: messagebox.showinfo("Success", f"File downloaded to:\n{f}"))
+    
+    def _download_file_thread(self, sock, filename):
+        """Handle a file download; runs on the receive thread"""
+        try:
             self.display_message(f"[DOWNLOAD] Requesting {filename}...\n", 'blue')
             
-            # Use lock to serialize socket access - keep locked for entire operation
-            with self.receive_lock:
-                # Temporarily set socket to blocking mode with longer timeout
-                self.sock.settimeout(30.0)
-                
-                # Send download command
-                self.sock.sendall(b"/download")
-                
-                # Small delay to ensure server processes command first
-                time.sleep(0.1)
-                
-                # Send filename
-                self.sock.sendall(filename.encode())
-                
-                # Receive response
-                response = self.sock.recv(BUFFER_SIZE).decode('utf-8', 'ignore')
-                
-                if response.startswith("ERROR"):
-                    self.display_message(f"[ERROR] {response.split('|')[1]}\n", 'red')
-                    self.sock.settimeout(1.0)
-                    return
-                
-                # Parse file size
-                parts = response.split('|')
-                if parts[0] != "OK":
-                    self.display_message(f"[ERROR] Invalid server response: {response}\n", 'red')
-                    self.sock.settimeout(1.0)
-                    return
-                
-                filesize = int(parts[1])
-                
-                # Send ready acknowledgment
-                self.sock.sendall(b"READY")
-                
-                # Receive file data
-                filepath = os.path.join(save_dir, filename)
-                received = 0
-                
-                self.display_message(f"[DOWNLOAD] Downloading {filename} ({filesize} bytes)...\n", 'blue')
-                
-                # Set socket to blocking mode (no timeout) for large file transfers
-                self.sock.settimeout(None)
-                
-                try:
-                    with open(filepath, 'wb') as f:
+            # Send download command and filename back to back - the server
+            # reads them as two lines, so no delay is needed in between
+            self.send_line("/download")
+            self.send_line(filename)
+            
+            # Receive response
+            kind, payload = self._recv_reply(sock)
+            if kind == FRAME_ERROR:
+                self.display_message(f"[ERROR] {payload.decode('utf-8', 'replace')}\n", 'red')
+                return
+            if kind != FRAME_READY:
+                self.display_message(f"[ERROR] Unexpected server reply: {kind!r}\n", 'red')
+                return
+            
+            # READY carries the file size and checksum; DATA frames follow
+            filesize, expected_crc = FILE_INFO.unpack(payload)
+            
+            # Receive file data
+            filepath = self._download_path(filename)
+            received = 0
+            
+            self.display_message(f"[DOWNLOAD] Downloading {filename} ({filesize} bytes)...\n", 'blue')
+            
+            # DATA frames (up to 1 MiB each) are received into one
+            # preallocated buffer and the file written FILE_CHUNK bytes at a time
+            buf = bytearray(min(FILE_CHUNK, max(filesize, 1)))
+            view = memoryview(buf)
+            filled = 0
+            
+            # Checksummed as each frame lands, while its bytes are still in cache
+            crc = 0
+            
+            try:
+                fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+                with open(fd, 'wb') as f:
+                    preallocate(fd, filesize)
+                    try:
                         while received < filesize:
-                            remaining = filesize - received
-                            chunk_size = min(BUFFER_SIZE, remaining)
-                            chunk = self.sock.recv(chunk_size)
-                            if not chunk:
-                                break
-                            f.write(chunk)
-                            received += len(chunk)
-                    
-                    # DEBUG: Log after file write completes
-                    print(f"DEBUG: File write complete. Received: {received}, Filesize: {filesize}")
-                    
-                except Exception as e:
-                    self.display_message(f"[ERROR] File write error: {e}\n", 'red')
-                    self.sock.settimeout(1.0)
-                    return
-                finally:
-                    # Always restore timeout after file transfer
-                    self.sock.settimeout(1.0)
-                
-                # DEBUG: Log before checking completion
-                print(f"DEBUG: Checking completion. received={received}, filesize={filesize}, equal={received == filesize}")
+                            kind, length = recv_frame_header(sock, self._inbox)
+                            if kind == FRAME_TEXT:
+                                # Chat sent while the file streams in
+                                payload = recv_payload(sock, self._inbox, length)
+                                self.display_message(payload.decode('utf-8', 'replace'))
+                                continue
+                            if kind != FRAME_DATA or received + length > filesize:
+                                raise ConnectionError(f"Unexpected frame {kind!r} during download")
+                            
+                            if filled + length > len(buf):
+                                f.write(view[:filled])
+                                filled = 0
+                            if length > len(buf):
+                                chunk = memoryview(bytearray(length))
+                                recv_payload_into(sock, self._inbox, chunk)
+                                crc = zlib.crc32(chunk, crc)
+                                f.write(chunk)
+                            else:
+                                chunk = view[filled:filled + length]
+                                recv_payload_into(sock, self._inbox, chunk)
+                                crc = zlib.crc32(chunk, crc)
+                                filled += length
+                            received += length
+                        f.write(view[:filled])
+                    finally:
+                        # Don't leave a failed download at its full preallocated size
+                        if received != filesize:
+                            f.truncate(f.tell())
+            except Exception as e:
+                self.display_message(f"[ERROR] File write error: {e}\n", 'red')
+                return
+            
+            # Check download completion and integrity
+            if received == filesize and crc == expected_crc:
+                self.display_message(f"[SUCCESS] Downloaded {filename} to {filepath}\n", 'green')
+                # Schedule messagebox on main thread
+                self.root.after(0, lambda f=filepath: messagebox.showinfo("Success", f"File downloaded to:\n{f}"))
+            elif received == filesize:
+                os.remove(filepath)
+                self.display_message(f"[ERROR] {filename} arrived corrupted (checksum mismatch); discarded\n", 'red')
+            else:
+                self.display_message(f"[ERROR] Download incomplete ({received}/{filesize} bytes)\n", 'red')
                 
-                # Check download completion
-                if received == filesize:
-                    print(f"DEBUG: About to display success message")
-                    self.display_message(f"[SUCCESS] Downloaded {filename} to {filepath}\n", 'green')
-                    print(f"DEBUG: Success message displayed, showing messagebox")
-                    # Schedule messagebox on main thread
-                    self.root.after(0, lambda f=filepath: messagebox.showinfo("Success", f"File downloaded to:\n{f}"))
-                else:
-                    print(f"DEBUG: Download incomplete")
-                    self.display_message(f"[ERROR] Download incomplete ({received}/{filesize} bytes)\n", 'red')
-                    
-        except socket.timeout as e:
-            self.display_message(f"\n[ERROR] Download failed: Connection timeout. Server may be busy.\n", 'red')
-            try:
-                self.sock.settimeout(1.0)
-            except:
-                pass
         except Exception as e:
             self.display_message(f"\n[ERROR] Download failed: {e}\n", 'red')
-            try:
-                self.sock.settimeout(1.0)
-            except:
-                pass
 
 
 def main():
+    ap = argparse.ArgumentParser(description="GUI Chat Client with File Sharing")
+    ap.add_argument("--sndbuf", type=int, default=None,
+                    help="Kernel send buffer size (default: OS autotuning)")
+    ap.add_argument("--rcvbuf", type=int, default=None,
+                    help="Kernel receive buffer size (default: OS autotuning)")
+    args = ap.parse_args()
+    
     root = tk.Tk()
-    app = ChatClientGUI(root)
+    app = ChatClientGUI(root, args.sndbuf, args.rcvbuf)
     
     def on_closing():
-        app.running = False
-        if app.sock:
-            try:
-                app.sock.close()
-            except:
-                pass
+        app.disconnect()
         root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -3,17 +3,87 @@ Modern GUI Chat Client with File Sharing
 Refined Tkinter interface while preserving existing network behavior.
 
 This file is a drop-in alternative to `client_gui.py`.
-All protocol- and thread-related logic is kept identical; only the UI
-layout and styling are improved.
+It speaks the same protocol with the same single sender thread; server
+data is read on the Tk event loop, and the UI layout and styling are
+improved.
 """
 
+import queue
+import re
+import select
 import socket
+import struct
+import sys
 import threading
+import collections
+from difflib import SequenceMatcher
 import tkinter as tk
 from tkinter import scrolledtext, filedialog, messagebox
+import tkinter.font as tkfont
 import os
 
-BUFFER_SIZE = 4096
+BUFFER_SIZE = 65536
+FILE_BUFFER = 1 << 20  # Downloads are written out in writes of this size, not per frame
+CONNECT_TIMEOUT = 5.0  # Seconds to wait for the server to accept the connection
+POLL_INTERVAL_MS = 20  # Socket polling period where Tk has no file handlers (Windows)
+# Most a poll reads before yielding to the GUI: 64 recvs, 4 MiB per tick
+POLL_READ_BUDGET = 4 << 20
+MAX_CHAT_LINES = 2000  # Older lines are dropped so the chat area stays cheap to lay out
+CHAT_TRIM_SLACK = 200  # Lines allowed past the cap before trimming, so trims are rare
+# /users polling slows down through these periods while the list doesn't change
+USERS_REFRESH_MS = (5000, 15000, 30000)
+USERS_BACKOFF_CYCLES = 3  # Unchanged replies before moving to the next period
+
+# Everything the server sends is a frame: kind byte + payload length + payload
+FRAME_HEADER = struct.Struct("!cI")
+FRAME_TEXT = b"T"  # chat and notifications (UTF-8)
+FRAME_READY = b"R"  # download accepted; payload is the file size and CRC-32
+FRAME_ERROR = b"E"  # download refused; payload is the error message
+FRAME_DATA = b"D"  # a piece of the file being downloaded
+FILE_INFO = struct.Struct("!QI")
+
+# Sent right after /upload: filename length and file size, then the filename
+UPLOAD_HEADER = struct.Struct("!HQ")
+
+# Chat lines from server.py look like "[HH:MM:SS] Name: text"
+CHAT_LINE = re.compile(r"(\[\d\d:\d\d:\d\d\])\s+([^:\n]+?)\s*:\s*(.*)", re.S)
+# Rows of a [USERS] reply look like "  1. Name"
+USER_ROW = re.compile(r"^\s*\d+\.\s+(\S.*?)\s*$", re.M)
+
+# Chat tag for system messages, keyed by their leading [TAG] word
+SYSTEM_TAGS = {
+    "[ERROR]": "error",
+    "[DISCONNECTED]": "error",
+    "[SUCCESS]": "success",
+    "[FILE]": "file",
+    "[DOWNLOAD]": "file",
+    "[UPLOAD]": "file",
+}
+
+
+def pop_frame(inbox: bytearray):
+    """Take one complete frame off the inbox; None if it hasn't fully arrived."""
+    if len(inbox) < FRAME_HEADER.size:
+        return None
+    kind, length = FRAME_HEADER.unpack_from(inbox)
+    end = FRAME_HEADER.size + length
+    if len(inbox) < end:
+        return None
+    payload = bytes(inbox[FRAME_HEADER.size:end])
+    del inbox[:end]
+    return kind, payload
+
+
+class Download:
+    """A file being received from the server, one DATA frame at a time."""
+
+    def __init__(self, filename: str, filepath: str, filesize: int):
+        self.filename = filename
+        self.filepath = filepath
+        self.filesize = filesize
+        self.received = 0
+        self.file = None
+        self.error = None
 
 
 class ChatClientGUI:
@@ -31,10 +101,25 @@ class ChatClientGUI:
         self.sock = None
         self.running = False
         self.username = ""
-        self.receive_lock = threading.Lock()
+        # Chat screen widgets; None until create_chat_frame builds them
+        self.chat_area = None
+        self.status_pill = None
+        self.users_listbox = None
+        self.users_label = None
+        self.outbox = queue.SimpleQueue()  # Everything written to the socket goes through here
+        self.sender_thread = None
+        self._inbox = bytearray()  # Received bytes not yet consumed as frames
+        self._recv_buf = memoryview(bytearray(BUFFER_SIZE))  # Reused by every recv
+        self._requested = collections.deque()  # Downloads waiting for READY/ERROR, in order
+        self._download = None  # Download whose DATA frames are arriving
+        self._chat_segments = []  # text, tags, text, tags, ... waiting for _flush_chat
+        self._flush_scheduled = False
 
         # Track auto refresh callback for users sidebar
         self._users_refresh_job = None
+        self._last_users: tuple = ()  # What the users listbox currently shows
+        self._users_unchanged = 0  # /users replies in a row that changed nothing
+        self._window_visible = True  # False while the window is minimized
 
         self.create_connection_frame()
 
@@ -57,6 +142,22 @@ class ChatClientGUI:
 
         self.root.configure(bg=self.bg_main)
 
+        # Named fonts are resolved by Tk once and shared by every widget and
+        # chat tag, instead of each one parsing its own font description
+        self.font_title = tkfont.Font(family="Segoe UI", size=20, weight="bold")
+        self.font_heading = tkfont.Font(family="Segoe UI", size=14, weight="bold")
+        self.font_button = tkfont.Font(family="Segoe UI", size=11, weight="bold")
+        self.font_label = tkfont.Font(family="Segoe UI", size=10, weight="bold")
+        self.font_body = tkfont.Font(family="Segoe UI", size=10)
+        self.font_small_bold = tkfont.Font(family="Segoe UI", size=9, weight="bold")
+        self.font_small = tkfont.Font(family="Segoe UI", size=9)
+        self.font_mono = tkfont.Font(family="Consolas", size=10)
+        self.font_mono_bold = tkfont.Font(family="Consolas", size=10, weight="bold")
+
+        # The users sidebar is only polled while it can be seen
+        self.root.bind("<Map>", self._on_map)
+        self.root.bind("<Unmap>", self._on_unmap)
+
     # ------------------------------------------------------------------
     # Connection screen
     # ------------------------------------------------------------------
@@ -79,7 +180,7 @@ class ChatClientGUI:
         title = tk.Label(
             card,
             text="Distributed Chat Client",
-            font=("Segoe UI", 20, "bold"),
+            font=self.font_title,
             bg=self.bg_panel,
             fg=self.fg_text,
         )
@@ -88,7 +189,7 @@ class ChatClientGUI:
         subtitle = tk.Label(
             card,
             text="Connect to your chat server and start sharing files.",
-            font=("Segoe UI", 10),
+            font=self.font_body,
             bg=self.bg_panel,
             fg="#9ca3af",
         )
@@ -98,7 +199,7 @@ class ChatClientGUI:
         tk.Label(
             card,
             text="Server Host",
-            font=("Segoe UI", 10, "bold"),
+            font=self.font_label,
             bg=self.bg_panel,
             fg="#d1d5db",
         ).grid(row=2, column=0, sticky="w", pady=(0, 4))
@@ -110,7 +211,7 @@ class ChatClientGUI:
         tk.Label(
             card,
             text="Port",
-            font=("Segoe UI", 10, "bold"),
+            font=self.font_label,
             bg=self.bg_panel,
             fg="#d1d5db",
         ).grid(row=4, column=0, sticky="w", pady=(0, 4))
@@ -122,7 +223,7 @@ class ChatClientGUI:
         tk.Label(
             card,
             text="Display Name",
-            font=("Segoe UI", 10, "bold"),
+            font=self.font_label,
             bg=self.bg_panel,
             fg="#d1d5db",
         ).grid(row=6, column=0, sticky="w", pady=(0, 4))
@@ -134,7 +235,7 @@ class ChatClientGUI:
             card,
             text="Connect",
             command=self.connect_to_server,
-            font=("Segoe UI", 11, "bold"),
+            font=self.font_button,
             bg=self.bg_button,
             fg="white",
             activebackground="#1d4ed8",
@@ -153,7 +254,7 @@ class ChatClientGUI:
         self.status_label = tk.Label(
             card,
             text="",
-            font=("Segoe UI", 9),
+            font=self.font_small,
             bg=self.bg_panel,
             fg="#9ca3af",
             anchor="w",
@@ -165,7 +266,7 @@ class ChatClientGUI:
     def _entry(self, parent: tk.Widget) -> tk.Entry:
         return tk.Entry(
             parent,
-            font=("Segoe UI", 10),
+            font=self.font_body,
             bg=self.bg_input,
             fg=self.fg_text,
             insertbackground=self.fg_text,
@@ -191,7 +292,7 @@ class ChatClientGUI:
         title = tk.Label(
             top_bar,
             text=f"{self.username}",
-            font=("Segoe UI", 11, "bold"),
+            font=self.font_button,
             bg="#020617",
             fg=self.fg_text,
         )
@@ -200,7 +301,7 @@ class ChatClientGUI:
         subtitle = tk.Label(
             top_bar,
             text="Connected to Distributed Chat Server",
-            font=("Segoe UI", 9),
+            font=self.font_small,
             bg="#020617",
             fg="#6b7280",
         )
@@ -210,7 +311,7 @@ class ChatClientGUI:
         self.status_pill = tk.Label(
             top_bar,
             text="● Disconnected",
-            font=("Segoe UI", 9, "bold"),
+            font=self.font_small_bold,
             bg="#020617",
             fg="#6b7280",
             padx=10,
@@ -244,7 +345,7 @@ class ChatClientGUI:
             chat_card,
             wrap=tk.WORD,
             state="disabled",
-            font=("Consolas", 10),
+            font=self.font_mono,
             bg="#020617",
             fg=self.fg_text,
             insertbackground=self.fg_text,
@@ -268,7 +369,7 @@ class ChatClientGUI:
         self.users_label = tk.Label(
             sidebar,
             text="Online users",
-            font=("Segoe UI", 10, "bold"),
+            font=self.font_label,
             bg=self.bg_panel,
             fg="#e5e7eb",
         )
@@ -283,7 +384,7 @@ class ChatClientGUI:
             relief="flat",
             selectbackground="#1d4ed8",
             selectforeground="#e5e7eb",
-            font=("Segoe UI", 9),
+            font=self.font_small,
         )
         self.users_listbox.pack(expand=True, fill="both", padx=10, pady=(0, 10))
 
@@ -296,18 +397,7 @@ class ChatClientGUI:
         )
         input_bar.pack(fill="x", side="bottom")
 
-        self.message_entry = tk.Entry(
-            input_bar,
-            font=("Segoe UI", 10),
-            bg=self.bg_input,
-            fg=self.fg_text,
-            insertbackground=self.fg_text,
-            relief="flat",
-            highlightthickness=1,
-            highlightbackground="#374151",
-            highlightcolor=self.accent,
-            bd=6,
-        )
+        self.message_entry = self._entry(input_bar)
         self.message_entry.pack(side="left", expand=True, fill="x", padx=(0, 8))
         self.message_entry.bind("<Return>", lambda _e: self.send_message())
 
@@ -315,7 +405,7 @@ class ChatClientGUI:
             input_bar,
             text="Send",
             command=self.send_message,
-            font=("Segoe UI", 10, "bold"),
+            font=self.font_label,
             bg=self.accent,
             fg="#022c22",
             activebackground="#16a34a",
@@ -329,20 +419,23 @@ class ChatClientGUI:
 
         self.message_entry.focus()
 
+        # Hidden until the Files button is clicked
+        self._build_files_dialog()
+
         # Configure tags for colored/system messages
         self.chat_area.tag_config("error", foreground="#f87171")
         self.chat_area.tag_config("success", foreground="#4ade80")
         self.chat_area.tag_config("file", foreground="#60a5fa")
         self.chat_area.tag_config(
-            "join", foreground="#22c55e", font=("Consolas", 10, "bold")
+            "join", foreground="#22c55e", font=self.font_mono_bold
         )
         self.chat_area.tag_config(
-            "leave", foreground="#fb923c", font=("Consolas", 10, "bold")
+            "leave", foreground="#fb923c", font=self.font_mono_bold
         )
         # New styling tags for regular chat lines
         self.chat_area.tag_config("timestamp", foreground="#9ca3af")
-        self.chat_area.tag_config("user", foreground="#e5e7eb", font=("Consolas", 10, "bold"))
-        self.chat_area.tag_config("self_user", foreground="#38bdf8", font=("Consolas", 10, "bold"))
+        self.chat_area.tag_config("user", foreground="#e5e7eb", font=self.font_mono_bold)
+        self.chat_area.tag_config("self_user", foreground="#38bdf8", font=self.font_mono_bold)
 
     def _top_button(self, parent, text, cmd, primary=False) -> tk.Button:
         bg = self.bg_button if primary else self.bg_button_secondary
@@ -352,7 +445,7 @@ class ChatClientGUI:
             parent,
             text=text,
             command=cmd,
-            font=("Segoe UI", 9, "bold"),
+            font=self.font_small_bold,
             bg=bg,
             fg="#e5e7eb",
             activebackground=hover,
@@ -389,89 +482,190 @@ class ChatClientGUI:
 
         if not self.username:
             self.username = f"User_{os.getpid()}"
+        # Interned, like the names parsed from chat lines, so the self check
+        # in display_message is usually an identity comparison
+        self.username = sys.intern(self.username)
 
         try:
             port = int(port)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid port number!")
+            return
 
-            self.status_label.config(text="Connecting...", fg="#60a5fa")
-            self.connect_btn.config(state="disabled")
+        self.status_label.config(text="Connecting...", fg="#60a5fa")
+        self.connect_btn.config(state="disabled")
 
-            # Create socket and connect
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.connect((host, port))
+        # connect() can take seconds on a slow or unreachable host; keep the
+        # window responsive and finish on the Tk thread
+        threading.Thread(
+            target=self._do_connect, args=(host, port), daemon=True
+        ).start()
 
-            self.running = True
+    def _do_connect(self, host: str, port: int) -> None:
+        """Open the connection on a worker thread and report back via after()."""
+        try:
+            # Resolves the name (IPv4 or IPv6) and gives up after
+            # CONNECT_TIMEOUT instead of the OS's much longer default
+            sock = socket.create_connection((host, port), timeout=CONNECT_TIMEOUT)
+        except Exception as e:
+            self.root.after(0, self._on_connect_failed, e)
+            return
+        try:
+            sock.settimeout(None)
+            # Chat lines are tiny: send them at once instead of letting Nagle
+            # hold them back, and ACK right away where the OS allows it.
+            # Buffer sizes are left to the kernel's autotuning
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if hasattr(socket, "TCP_QUICKACK"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            # Notice a server that went away without closing the connection
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        except OSError as e:
+            sock.close()
+            self.root.after(0, self._on_connect_failed, e)
+            return
+        self.root.after(0, self._on_connected, sock)
 
-            # Switch to chat interface BEFORE starting receive thread
-            self.conn_frame.destroy()
-            self.create_chat_frame()
+    def _on_connected(self, sock: socket.socket) -> None:
+        """Switch to the chat interface once the socket is connected."""
+        self.sock = sock
+        self.running = True
 
-            # Start connection status and user auto-refresh
-            self._set_status("Connected", "#22c55e")
-            self._schedule_users_refresh(initial=True)
+        # Switch to chat interface BEFORE reading from the server
+        self.conn_frame.destroy()
+        self.create_chat_frame()
 
-            # Wait for server prompt and send username
-            import time
+        # Start connection status and user auto-refresh
+        self._set_status("Connected", "#22c55e")
+        self._schedule_users_refresh(initial=True)
 
-            time.sleep(0.2)
-            self.sock.sendall(self.username.encode())
+        # Single writer thread owns all sends on the socket
+        self.sender_thread = threading.Thread(target=self.send_loop, daemon=True)
+        self.sender_thread.start()
 
-            # Start receive thread
-            receive_thread = threading.Thread(
-                target=self.receive_messages, daemon=True
-            )
-            receive_thread.start()
+        # Username is the first line; the server buffers it until it asks
+        self.send(self.username.encode() + b"\n")
 
-        except ValueError:
-            messagebox.showerror("Error", "Invalid port number!")
-            self.connect_btn.config(state="normal")
-        except ConnectionRefusedError:
+        # Reads happen on the Tk thread whenever the socket has data
+        self._watch_socket()
+
+    def _on_connect_failed(self, error: Exception) -> None:
+        """Report a failed connection attempt and allow another one."""
+        if isinstance(error, ConnectionRefusedError):
             messagebox.showerror(
                 "Error", "Could not connect to server. Is it running?"
             )
-            self.connect_btn.config(state="normal")
-            self.status_label.config(text="Connection failed", fg="#f87171")
-            self._set_status("Disconnected", "#f97316")
-        except Exception as e:
-            messagebox.showerror("Error", f"Connection error: {e}")
-            self.connect_btn.config(state="normal")
-            self.status_label.config(text="Connection failed", fg="#f87171")
-            self._set_status("Disconnected", "#f97316")
-
-    def receive_messages(self) -> None:
-        """Continuously receive messages from server."""
-        while self.running:
+        elif isinstance(error, socket.gaierror):
+            messagebox.showerror("Error", f"Unknown host: {error}")
+        elif isinstance(error, TimeoutError):
+            messagebox.showerror("Error", "Connection timed out.")
+        else:
+            messagebox.showerror("Error", f"Connection error: {error}")
+        self.connect_btn.config(state="normal")
+        self.status_label.config(text="Connection failed", fg="#f87171")
+        self._set_status("Disconnected", "#f97316")
+
+    def _watch_socket(self) -> None:
+        """Have the Tk event loop call _on_readable when the socket has data.
+
+        Uses a Tk file handler where the platform has them; Windows does
+        not, so there the socket is polled from the event loop instead.
+        """
+        if hasattr(self.root.tk, "createfilehandler"):
+            self.root.tk.createfilehandler(self.sock, tk.READABLE, self._on_readable)
+        else:
+            self._poll_socket()
+
+    def _unwatch_socket(self) -> None:
+        """Stop calling _on_readable for the socket."""
+        if hasattr(self.root.tk, "deletefilehandler"):
             try:
-                if self.receive_lock.acquire(blocking=False):
-                    try:
-                        self.sock.settimeout(1.0)
-                        data = self.sock.recv(BUFFER_SIZE)
-
-                        if not data:
-                            self.running = False
-                            self.display_message(
-                                "\n[DISCONNECTED] Connection lost.\n", "red"
-                            )
-                            self._set_status("Disconnected", "#f97316")
-                            break
-
-                        message = data.decode("utf-8", "ignore")
-                        self.display_message(message)
-                    finally:
-                        self.receive_lock.release()
-                else:
-                    import time
+                self.root.tk.deletefilehandler(self.sock)
+            except Exception:
+                pass
 
-                    time.sleep(0.1)
+    def _poll_socket(self) -> None:
+        """Read while the socket has data, then check again shortly.
 
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if self.running:
-                    self.display_message(f"\n[ERROR] {e}\n", "red")
-                    self._set_status("Error", "#f97316")
-                self.running = False
+        One recv per tick would cap downloads at a buffer every 20 ms, so
+        each tick keeps reading until the socket is drained or the read
+        budget is used up, and only then hands control back to Tk.
+        """
+        budget = POLL_READ_BUDGET
+        while self.running and budget > 0:
+            try:
+                readable, _, _ = select.select([self.sock], [], [], 0)
+            except (OSError, ValueError):
+                return
+            if not readable:
                 break
+            self._on_readable()
+            budget -= len(self._recv_buf)
+        if self.running:
+            self.root.after(POLL_INTERVAL_MS, self._poll_socket)
+
+    def _on_readable(self, _fd=None, _mask=None) -> None:
+        """Read what the server sent and handle every complete frame.
+
+        The socket is known to be readable, so this single recv never
+        blocks the GUI. Anything left over makes Tk call back right away.
+        """
+        try:
+            received = self.sock.recv_into(self._recv_buf)
+        except Exception as e:
+            if self.running:
+                self.display_message(f"\n[ERROR] {e}\n", "red")
+                self._set_status("Error", "#f97316")
+            self._connection_lost()
+            return
+
+        if not received:
+            if self.running:
+                self.display_message("\n[DISCONNECTED] Connection lost.\n", "red")
+                self._set_status("Disconnected", "#f97316")
+            self._connection_lost()
+            return
+
+        # Several messages can arrive in one read
+        self._inbox += self._recv_buf[:received]
+        self._handle_frames()
+
+    def _connection_lost(self) -> None:
+        """Stop reading and give up on a download that was still arriving."""
+        self.running = False
+        self._unwatch_socket()
+        dl, self._download = self._download, None
+        if dl is not None:
+            if dl.file is not None:
+                dl.file.close()
+            self.display_message(
+                f"[ERROR] Download incomplete ({dl.received}/{dl.filesize} bytes)\n",
+                "red",
+            )
+
+    def _handle_frames(self) -> None:
+        """Display text frames and feed download frames to the download handlers.
+
+        DATA payloads are passed on as views of the inbox, so file data is
+        not copied into a new bytes object on its way to disk.
+        """
+        inbox = self._inbox
+        while len(inbox) >= FRAME_HEADER.size:
+            kind, length = FRAME_HEADER.unpack_from(inbox)
+            end = FRAME_HEADER.size + length
+            if len(inbox) < end:
+                return
+            if kind == FRAME_DATA:
+                # The view must be released before the inbox can shrink
+                with memoryview(inbox)[FRAME_HEADER.size : end] as payload:
+                    self._on_download_data(payload)
+                del inbox[:end]
+                continue
+            kind, payload = pop_frame(inbox)
+            if kind == FRAME_TEXT:
+                self.display_message(payload.decode("utf-8", "replace"))
+            else:
+                self._on_download_frame(kind, payload)
 
     def display_message(self, message: str, color: str = "black") -> None:
         """Display message in chat area with nicer styling.
@@ -480,55 +674,71 @@ class ChatClientGUI:
           sidebar.
         - Highlights timestamps and usernames for normal chat lines.
         - Distinguishes system messages (join/leave, errors, files).
+
+        Styled pieces are collected and written by _flush_chat once the
+        event loop is idle, so a burst of messages costs one insert and
+        one scroll instead of several per message.
         """
-        if not hasattr(self, "chat_area") or self.chat_area is None:
+        if self.chat_area is None:
             return
 
-        self.chat_area.config(state="normal")
-
         # If this is a users list message, refresh the sidebar only
         # to avoid flooding the chat during auto-refresh.
         if message.startswith("[USERS]"):
             self._update_users_sidebar_from_message(message)
+            return
+
+        segments = self._chat_segments
+        # Standard chat lines: [HH:MM:SS] Name: text
+        chat = CHAT_LINE.match(message)
+        if chat:
+            timestamp, username, body = chat.groups()
+            # The regex already drops the spaces around the name
+            username = sys.intern(username)
+
+            # Choose tag for username: self vs others
+            user_tag = "self_user" if username == self.username else "user"
+
+            # Extra spacing between messages
+            segments += ("\n", "", timestamp + " ", "timestamp", username, user_tag)
+            if body:
+                segments += (": " + body + "\n", "")
         else:
-            # Try to detect standard chat lines: [HH:MM:SS] Name: text
-            if message.startswith("[") and "]" in message and ":" in message:
-                end_bracket = message.find("]")
-                timestamp = message[: end_bracket + 1]
-                rest = message[end_bracket + 1 :].lstrip()
-
-                if ":" in rest:
-                    name_part, body = rest.split(":", 1)
-                    username = name_part.strip()
-                    body = body.lstrip()
-
-                    # Choose tag for username: self vs others
-                    user_tag = "self_user" if username == self.username else "user"
-
-                    # Extra spacing between messages
-                    self.chat_area.insert(tk.END, "\n")
-                    self.chat_area.insert(tk.END, timestamp + " ", "timestamp")
-                    self.chat_area.insert(tk.END, username, user_tag)
-                    if body:
-                        self.chat_area.insert(tk.END, ": " + body + "\n")
-                else:
-                    # Fallback if format is unexpected
-                    self.chat_area.insert(tk.END, message)
+            # System / informational messages: classified by their first
+            # word, e.g. "[ERROR]" or the "*" of "* Name joined the chat *"
+            first = message.lstrip("\n").partition(" ")[0]
+            tag = SYSTEM_TAGS.get(first)
+            if first in ("[FILE]", "[FILES]") and "uploaded" in message:
+                # Upload notices and file listings (whose rows name the
+                # uploader) are shown as successes
+                tag = "success"
+            elif tag is None and first == "*":
+                joined = message.rstrip().endswith("joined the chat *")
+                tag = "join" if joined else "leave"
+            if tag is not None:
+                segments += ("\n" + message, tag)
             else:
-                # System / informational messages
-                if "[ERROR]" in message or "DISCONNECTED" in message:
-                    self.chat_area.insert(tk.END, "\n" + message, "error")
-                elif "[SUCCESS]" in message or "uploaded" in message:
-                    self.chat_area.insert(tk.END, "\n" + message, "success")
-                elif "[FILE]" in message or "[DOWNLOAD]" in message or "[UPLOAD]" in message:
-                    self.chat_area.insert(tk.END, "\n" + message, "file")
-                elif "*" in message and "joined" in message:
-                    self.chat_area.insert(tk.END, "\n" + message, "join")
-                elif "*" in message and "left" in message:
-                    self.chat_area.insert(tk.END, "\n" + message, "leave")
-                else:
-                    self.chat_area.insert(tk.END, message)
+                segments += (message, "")
+
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.root.after_idle(self._flush_chat)
 
+    def _flush_chat(self) -> None:
+        """Write all pending chat segments in one insert and scroll once."""
+        self._flush_scheduled = False
+        segments, self._chat_segments = self._chat_segments, []
+        if not segments:
+            return
+
+        # Text.insert takes alternating text/tags arguments
+        self.chat_area.config(state="normal")
+        self.chat_area.insert(tk.END, *segments)
+
+        # Keep only the newest lines, trimmed in one delete
+        lines = int(self.chat_area.index("end-1c").split(".")[0])
+        if lines > MAX_CHAT_LINES + CHAT_TRIM_SLACK:
+            self.chat_area.delete("1.0", f"{lines - MAX_CHAT_LINES}.0")
         self.chat_area.config(state="disabled")
         self.chat_area.see(tk.END)
 
@@ -537,15 +747,37 @@ class ChatClientGUI:
     # ------------------------------------------------------------------
     def _set_status(self, text: str, color: str) -> None:
         """Update the status pill text/color if it exists."""
-        if hasattr(self, "status_pill") and self.status_pill is not None:
+        if self.status_pill is not None:
             self.status_pill.config(text=f"● {text}", fg=color)
 
+    def _on_map(self, event) -> None:
+        """Resume /users polling, with a fresh list, once the window is shown."""
+        # Child widgets report their own Map events through the root binding
+        if event.widget is not self.root or self._window_visible:
+            return
+        self._window_visible = True
+        self._users_unchanged = 0
+        self._schedule_users_refresh(initial=True)
+
+    def _on_unmap(self, event) -> None:
+        """Note that the window was minimized or withdrawn."""
+        if event.widget is self.root:
+            self._window_visible = False
+
+    def _users_refresh_interval(self) -> int:
+        """Milliseconds until the next /users, longer while nothing changes."""
+        step = min(
+            self._users_unchanged // USERS_BACKOFF_CYCLES, len(USERS_REFRESH_MS) - 1
+        )
+        return USERS_REFRESH_MS[step]
+
     def _schedule_users_refresh(self, initial: bool = False) -> None:
         """Schedule periodic /users requests while connected.
 
         Uses Tk's after() so it stays on the main thread. This does *not*
         wait for or parse responses here; responses are handled normally
-        in receive_messages/display_message.
+        in _handle_frames/display_message. Nothing is sent while the window
+        is minimized, and the period backs off while the list is unchanged.
         """
         # Cancel any existing job first
         if self._users_refresh_job is not None:
@@ -559,24 +791,28 @@ class ChatClientGUI:
             return
 
         def refresh() -> None:
+            self._users_refresh_job = None
             if not self.running or self.sock is None:
                 return
-            try:
-                # This uses the same command as the Users button
-                self.sock.sendall(b"/users")
-            except Exception:
-                # If this fails, just stop refreshing; receive loop will handle errors
+            if not self._window_visible:
+                # _on_map starts the loop again
                 return
+            # This uses the same command as the Users button
+            self.send(b"/users\n")
 
             # Reschedule next refresh
             if self.running:
-                self._users_refresh_job = self.root.after(5000, refresh)
+                self._users_refresh_job = self.root.after(
+                    self._users_refresh_interval(), refresh
+                )
 
         # Kick off the loop
         if initial:
             self._users_refresh_job = self.root.after(1000, refresh)
         else:
-            self._users_refresh_job = self.root.after(5000, refresh)
+            self._users_refresh_job = self.root.after(
+                self._users_refresh_interval(), refresh
+            )
 
     def _update_users_sidebar_from_message(self, message: str) -> None:
         """Parse `[USERS]` server message and update sidebar listbox.
@@ -587,28 +823,80 @@ class ChatClientGUI:
               1. Alice\n
               2. Bob\n
         """
-        if not hasattr(self, "users_listbox"):
+        if self.users_listbox is None:
             return
 
-        # Extract lines after the header
-        lines = message.splitlines()
-        user_lines = [ln.strip() for ln in lines[1:] if ln.strip()]
+        users = USER_ROW.findall(message)
 
-        users = []
-        for ln in user_lines:
-            # each line is like "1. username" — split on first '. '
-            parts = ln.split(". ", 1)
-            if len(parts) == 2:
-                users.append(parts[1].strip())
+        # The list is refreshed every few seconds and rarely changes: only
+        # touch the rows that differ from what is shown
+        new = tuple(users)
+        old = self._last_users
+        if new == old:
+            self._users_unchanged += 1
+            return
+        self._users_unchanged = 0
 
-        self.users_listbox.delete(0, tk.END)
-        for u in users:
-            # Use a simple bullet prefix for visual clarity
-            self.users_listbox.insert(tk.END, f"• {u}")
+        # Back to front, so the indices of earlier edits stay valid
+        opcodes = SequenceMatcher(None, old, new, autojunk=False).get_opcodes()
+        for op, i1, i2, j1, j2 in reversed(opcodes):
+            if op == "equal":
+                continue
+            if i2 > i1:
+                self.users_listbox.delete(i1, i2 - 1)
+            for offset, u in enumerate(new[j1:j2]):
+                # Use a simple bullet prefix for visual clarity
+                self.users_listbox.insert(i1 + offset, f"• {u}")
+        self._last_users = new
 
         # Update online count in label, if present
-        if hasattr(self, "users_label") and self.users_label is not None:
-            self.users_label.config(text=f"Online users ({len(users)})")
+        if len(new) != len(old) and self.users_label is not None:
+            self.users_label.config(text=f"Online users ({len(new)})")
+
+    def send_loop(self) -> None:
+        """Sole writer on the socket: send queued items in FIFO order.
+
+        Items are bytes, or callables taking the socket (used to stream file
+        payloads in order with chat traffic). None stops the loop.
+        """
+        while True:
+            item = self.outbox.get()
+            if item is None:
+                break
+            try:
+                if callable(item):
+                    item(self.sock)
+                else:
+                    self.sock.sendall(item)
+            except Exception as e:
+                if self.running:
+                    self.root.after(
+                        0, self.display_message, f"\n[ERROR] Send failed: {e}\n", "red"
+                    )
+
+    def send(self, data) -> None:
+        """Queue bytes or a job(sock) for the sender thread (never blocks the caller)."""
+        self.outbox.put(data)
+
+    def disconnect(self) -> None:
+        """Stop reading, flush pending sends and close the socket."""
+        self.running = False
+        if self._users_refresh_job is not None:
+            try:
+                self.root.after_cancel(self._users_refresh_job)
+            except Exception:
+                pass
+            self._users_refresh_job = None
+        if self.sock is not None:
+            self._unwatch_socket()
+        if self.sender_thread is not None:
+            self.outbox.put(None)
+            self.sender_thread.join(timeout=2.0)
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
 
     def send_message(self) -> None:
         """Send message to server (same behavior)."""
@@ -617,108 +905,99 @@ class ChatClientGUI:
         if not message:
             return
 
-        try:
-            self.sock.sendall(message.encode())
-            self.message_entry.delete(0, tk.END)
-
-            if message == "/quit":
-                self.running = False
-                # Stop users auto-refresh if any
-                if self._users_refresh_job is not None:
-                    try:
-                        self.root.after_cancel(self._users_refresh_job)
-                    except Exception:
-                        pass
-                    self._users_refresh_job = None
-                self.sock.close()
-                self.root.destroy()
+        self.send(message.encode() + b"\n")
+        self.message_entry.delete(0, tk.END)
 
-        except Exception as e:
-            self.display_message(f"\n[ERROR] Send failed: {e}\n", "red")
+        if message == "/quit":
+            self.disconnect()
+            self.root.destroy()
 
     def show_users(self) -> None:
         """Request and display user list (same command)."""
-        try:
-            self.sock.sendall(b"/users")
-        except Exception as e:
-            self.display_message(f"\n[ERROR] {e}\n", "red")
+        self.send(b"/users\n")
 
     def show_files(self) -> None:
         """Show available files and download options (modern dialog)."""
-        try:
-            self.sock.sendall(b"/files")
-
-            dialog = tk.Toplevel(self.root)
-            dialog.title("Shared Files")
-            dialog.geometry("520x420")
-            dialog.configure(bg=self.bg_panel)
-
-            header = tk.Label(
-                dialog,
-                text="Shared Files",
-                font=("Segoe UI", 14, "bold"),
-                bg=self.bg_panel,
-                fg=self.fg_text,
-            )
-            header.pack(pady=(16, 4))
-
-            info = tk.Label(
-                dialog,
-                text="Type a filename from the list in the chat and click Download.",
-                font=("Segoe UI", 9),
-                bg=self.bg_panel,
-                fg="#9ca3af",
-                wraplength=460,
-                justify="left",
-            )
-            info.pack(pady=(0, 12))
-
-            # Input row
-            row = tk.Frame(dialog, bg=self.bg_panel)
-            row.pack(pady=8)
-
-            filename_entry = self._entry(row)
-            filename_entry.config(width=32)
-            filename_entry.pack(side="left", padx=(0, 8))
-
-            def do_download() -> None:
-                filename = filename_entry.get().strip()
-                if filename:
-                    self.download_file(filename)
-                    dialog.destroy()
-
-            dl_btn = tk.Button(
-                row,
-                text="Download",
-                command=do_download,
-                font=("Segoe UI", 9, "bold"),
-                bg=self.bg_button,
-                fg="white",
-                bd=0,
-                padx=14,
-                pady=6,
-                cursor="hand2",
-            )
-            dl_btn.pack(side="left")
-
-            close_btn = tk.Button(
-                dialog,
-                text="Close",
-                command=dialog.destroy,
-                font=("Segoe UI", 9),
-                bg=self.bg_button_secondary,
-                fg=self.fg_text,
-                bd=0,
-                padx=20,
-                pady=6,
-                cursor="hand2",
-            )
-            close_btn.pack(pady=(18, 12))
+        self.send(b"/files\n")
+        self._files_entry.delete(0, tk.END)
+        self._files_dialog.deiconify()
+        self._files_dialog.lift()
+        self._files_entry.focus()
+
+    def _build_files_dialog(self) -> None:
+        """Create the Files dialog once; show_files only shows it again."""
+        dialog = tk.Toplevel(self.root)
+        dialog.withdraw()
+        dialog.title("Shared Files")
+        dialog.geometry("520x420")
+        dialog.configure(bg=self.bg_panel)
+        # Closing the window hides it for the next time
+        dialog.protocol("WM_DELETE_WINDOW", dialog.withdraw)
+
+        header = tk.Label(
+            dialog,
+            text="Shared Files",
+            font=self.font_heading,
+            bg=self.bg_panel,
+            fg=self.fg_text,
+        )
+        header.pack(pady=(16, 4))
 
-            filename_entry.focus()
+        info = tk.Label(
+            dialog,
+            text="Type a filename from the list in the chat and click Download.",
+            font=self.font_small,
+            bg=self.bg_panel,
+            fg="#9ca3af",
+            wraplength=460,
+            justify="left",
+        )
+        info.pack(pady=(0, 12))
+
+        # Input row
+        row = tk.Frame(dialog, bg=self.bg_panel)
+        row.pack(pady=8)
+
+        filename_entry = self._entry(row)
+        filename_entry.config(width=32)
+        filename_entry.pack(side="left", padx=(0, 8))
+
+        def do_download() -> None:
+            filename = filename_entry.get().strip()
+            if filename:
+                self.download_file(filename)
+                dialog.withdraw()
+
+        dl_btn = tk.Button(
+            row,
+            text="Download",
+            command=do_download,
+            font=self.font_small_bold,
+            bg=self.bg_button,
+            fg="white",
+            bd=0,
+            padx=14,
+            pady=6,
+            cursor="hand2",
+        )
+        dl_btn.pack(side="left")
+
+        close_btn = tk.Button(
+            dialog,
+            text="Close",
+            command=dialog.withdraw,
+            font=self.font_small,
+            bg=self.bg_button_secondary,
+            fg=self.fg_text,
+            bd=0,
+            padx=20,
+            pady=6,
+            cursor="hand2",
+        )
+        close_btn.pack(pady=(18, 12))
 
-        except Exception as e:
-            self.display_message(f"\n[ERROR] {e}\n", "red")
+        self._files_dialog = dialog
+        self._files_entry = filename_entry
 
     def upload_file(self) -> None:
         """Upload a file to the server (same protocol)."""
@@ -727,190 +1006,136 @@ class ChatClientGUI:
         if not filepath:
             return
 
-        upload_thread = threading.Thread(
-            target=self._upload_file_thread, args=(filepath,), daemon=True
-        )
-        upload_thread.start()
-
-    def _upload_file_thread(self, filepath: str) -> None:
-        import time
-
         try:
             filename = os.path.basename(filepath)
             filesize = os.path.getsize(filepath)
-
-            with self.receive_lock:
-                self.sock.settimeout(30.0)
-
-                self.sock.sendall(b"/upload")
-                ready_msg = self.sock.recv(BUFFER_SIZE)
-
-                if b"Ready to receive" not in ready_msg:
-                    self.display_message(
-                        f"[ERROR] Unexpected response: {ready_msg.decode()}\n", "red"
-                    )
-                    self.sock.settimeout(1.0)
-                    return
-
-                metadata = f"{filename}|{filesize}"
-                self.sock.sendall(metadata.encode())
-
-                ack = self.sock.recv(BUFFER_SIZE)
-                if ack != b"READY":
-                    self.display_message(
-                        "[ERROR] Server not ready for transfer\n", "red"
-                    )
-                    self.sock.settimeout(1.0)
-                    return
-
-                self.display_message(
-                    f"[UPLOAD] Uploading {filename} ({filesize} bytes)...\n", "blue"
-                )
-
-                sent = 0
-                with open(filepath, "rb") as f:
-                    while sent < filesize:
-                        chunk = f.read(BUFFER_SIZE)
-                        if not chunk:
-                            break
-                        self.sock.sendall(chunk)
-                        sent += len(chunk)
-
-                try:
-                    confirmation = self.sock.recv(BUFFER_SIZE).decode(
-                        "utf-8", "ignore"
-                    )
-                    self.display_message(confirmation)
-                except socket.timeout:
-                    self.display_message(
-                        "[INFO] Upload sent, waiting for server confirmation...\n",
-                        "blue",
-                    )
-
-                self.sock.settimeout(1.0)
-
-        except socket.timeout:
-            self.display_message(
-                "\n[ERROR] Upload failed: Connection timeout. Server may be busy.\n",
-                "red",
-            )
-            try:
-                self.sock.settimeout(1.0)
-            except Exception:
-                pass
-        except Exception as e:
+        except OSError as e:
             self.display_message(f"\n[ERROR] Upload failed: {e}\n", "red")
-            try:
-                self.sock.settimeout(1.0)
-            except Exception:
-                pass
+            return
 
-    def download_file(self, filename: str) -> None:
-        """Download a file from the server (threaded)."""
-        download_thread = threading.Thread(
-            target=self._download_file_thread, args=(filename,), daemon=True
+        self.display_message(
+            f"[UPLOAD] Uploading {filename} ({filesize} bytes)...\n", "blue"
         )
-        download_thread.start()
 
-    def _download_file_thread(self, filename: str) -> None:
-        import time
+        # No handshake: header and data go out back to back on the sender
+        # thread; the server's confirmation is shown like any chat message
+        name = filename.encode()
+        header = b"/upload\n" + UPLOAD_HEADER.pack(len(name), filesize) + name
+        self.send(lambda sock: self._send_file_data(sock, header, filepath, filesize))
+
+    def _send_file_data(
+        self, sock: socket.socket, header: bytes, filepath: str, filesize: int
+    ) -> None:
+        """Send an upload header and the file behind it; runs on the sender thread."""
+        # Opened before the header goes out, so a missing file sends nothing
+        with open(filepath, "rb") as f:
+            # The header leaves in the same send as the start of the file
+            # instead of as a tiny segment of its own; small files go out in
+            # one send
+            first = f.read(min(BUFFER_SIZE, filesize))
+            sock.sendall(header + first)
+            sent = len(first)
+            try:
+                # Zero-copy: kernel sendfile(2) instead of read + sendall
+                if sent < filesize:
+                    sent += sock.sendfile(f, sent, filesize - sent)
+            except (AttributeError, OSError):
+                # sendfile unsupported here; continue where it stopped with
+                # a plain read loop
+                sent = f.tell()
+                while sent < filesize:
+                    chunk = f.read(min(BUFFER_SIZE, filesize - sent))
+                    if not chunk:
+                        break
+                    sock.sendall(chunk)
+                    sent += len(chunk)
 
+    def download_file(self, filename: str) -> None:
+        """Request a file; its frames are handled as they arrive on the Tk thread."""
         save_dir = "downloads"
 
         try:
             if not os.path.exists(save_dir):
                 os.makedirs(save_dir)
+        except OSError as e:
+            self.display_message(f"\n[ERROR] Download failed: {e}\n", "red")
+            return
 
-            self.display_message(f"[DOWNLOAD] Requesting {filename}...\n", "blue")
-
-            with self.receive_lock:
-                self.sock.settimeout(30.0)
-
-                self.sock.sendall(b"/download")
-                time.sleep(0.1)
-
-                self.sock.sendall(filename.encode())
-
-                response = self.sock.recv(BUFFER_SIZE).decode("utf-8", "ignore")
-
-                if response.startswith("ERROR"):
-                    self.display_message(
-                        f"[ERROR] {response.split('|')[1]}\n", "red"
-                    )
-                    self.sock.settimeout(1.0)
-                    return
+        self.display_message(f"[DOWNLOAD] Requesting {filename}...\n", "blue")
 
-                parts = response.split("|")
-                if parts[0] != "OK":
-                    self.display_message(
-                        f"[ERROR] Invalid server response: {response}\n", "red"
-                    )
-                    self.sock.settimeout(1.0)
-                    return
+        # Replies come back in request order, so a queue pairs them up
+        self._requested.append(filename)
+        self.send(b"/download\n" + filename.encode() + b"\n")
 
-                filesize = int(parts[1])
+    def _on_download_data(self, payload: memoryview) -> None:
+        """Write a DATA frame of the current download to its file."""
+        dl = self._download
+        if dl is None:
+            return
+        if dl.file is not None:
+            try:
+                dl.file.write(payload)
+            except OSError as e:
+                dl.error = e
+                dl.file.close()
+                dl.file = None
+        dl.received += len(payload)
+        if dl.received >= dl.filesize:
+            self._finish_download()
+
+    def _on_download_frame(self, kind: bytes, payload: bytes) -> None:
+        """Handle the READY or ERROR reply to the oldest download request."""
+        if not self._requested:
+            return
+        filename = self._requested.popleft()
 
-                self.sock.sendall(b"READY")
+        if kind != FRAME_READY:
+            error = payload.decode("utf-8", "replace")
+            if kind != FRAME_ERROR:
+                error = f"Unexpected server reply: {kind!r}"
+            self.display_message(f"[ERROR] {error}\n", "red")
+            return
 
-                filepath = os.path.join(save_dir, filename)
-                received = 0
+        # READY carries the file size; DATA frames follow
+        filesize, _ = FILE_INFO.unpack(payload)
+        dl = Download(filename, os.path.join("downloads", filename), filesize)
 
-                self.display_message(
-                    f"[DOWNLOAD] Downloading {filename} ({filesize} bytes)...\n",
-                    "blue",
-                )
+        self.display_message(
+            f"[DOWNLOAD] Downloading {filename} ({filesize} bytes)...\n",
+            "blue",
+        )
 
-                self.sock.settimeout(None)
-
-                try:
-                    with open(filepath, "wb") as f:
-                        while received < filesize:
-                            remaining = filesize - received
-                            chunk_size = min(BUFFER_SIZE, remaining)
-                            chunk = self.sock.recv(chunk_size)
-                            if not chunk:
-                                break
-                            f.write(chunk)
-                            received += len(chunk)
-
-                except Exception as e:
-                    self.display_message(f"[ERROR] File write error: {e}\n", "red")
-                    self.sock.settimeout(1.0)
-                    return
-                finally:
-                    self.sock.settimeout(1.0)
-
-                if received == filesize:
-                    self.display_message(
-                        f"[SUCCESS] Downloaded {filename} to {filepath}\n", "green"
-                    )
-                    self.root.after(
-                        0,
-                        lambda f=filepath: messagebox.showinfo(
-                            "Success", f"File downloaded to:\n{f}"
-                        ),
-                    )
-                else:
-                    self.display_message(
-                        f"[ERROR] Download incomplete ({received}/{filesize} bytes)\n",
-                        "red",
-                    )
+        try:
+            # Full DATA frames are as large as this buffer and go straight
+            # to the file; it only gathers a short final frame
+            dl.file = open(dl.filepath, "wb", buffering=FILE_BUFFER)
+        except OSError as e:
+            # The DATA frames still have to be consumed
+            dl.error = e
+
+        self._download = dl
+        if filesize == 0:
+            self._finish_download()
+
+    def _finish_download(self) -> None:
+        """Close the completed download and report the result."""
+        dl, self._download = self._download, None
+        if dl.file is not None:
+            dl.file.close()
+
+        if dl.error is not None:
+            self.display_message(f"[ERROR] File write error: {dl.error}\n", "red")
+            return
 
-        except socket.timeout:
-            self.display_message(
-                "\n[ERROR] Download failed: Connection timeout. Server may be busy.\n",
-                "red",
-            )
-            try:
-                self.sock.settimeout(1.0)
-            except Exception:
-                pass
-        except Exception as e:
-            self.display_message(f"\n[ERROR] Download failed: {e}\n", "red")
-            try:
-                self.sock.settimeout(1.0)
-            except Exception:
-                pass
+        self.display_message(
+            f"[SUCCESS] Downloaded {dl.filename} to {dl.filepath}\n", "green"
+        )
+        self.root.after(
+            0,
+            lambda f=dl.filepath: messagebox.showinfo(
+                "Success", f"File downloaded to:\n{f}"
+            ),
+        )
 
 
 def main() -> None:
@@ -918,19 +1143,7 @@ def main() -> None:
     app = ChatClientGUI(root)
 
     def on_closing() -> None:
-        app.running = False
-        # Cancel any pending auto-refresh job
-        if getattr(app, "_users_refresh_job", None) is not None:
-            try:
-                root.after_cancel(app._users_refresh_job)
-            except Exception:
-                pass
-            app._users_refresh_job = None
-        if app.sock:
-            try:
-                app.sock.close()
-            except Exception:
-                pass
+        app.disconnect()
         root.destroy()
 
     root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -8,33 +8,168 @@ import threading
 import os
 import json
 import time
+import struct
+import zlib
+import contextlib
+import argparse
+import traceback
 from datetime import datetime
 
 # Global data structures
-clients = {}  # {conn: {"name": str, "addr": tuple}}
-files_shared = {}  # {filename: {"uploader": str, "timestamp": str, "size": int}}
+clients = {}  # {conn: {"name": str, "name_bytes": bytes, "addr": tuple, "inbox": bytearray, ...}}
+# Immutable copy of clients.items(), replaced on every join and leave, so
+# broadcasts and /users read it without taking clients_lock
+clients_snapshot = ()
+files_shared = {}  # {filename: {"uploader": str, "timestamp": str, "size": int, "crc32": int, "listing": bytes}}
 files_lock = threading.Lock()
 clients_lock = threading.Lock()
+send_locks = {}  # {conn: Lock} so frames from different threads never interleave
 
 # Configuration
-BUFFER_SIZE = 4096
+BUFFER_SIZE = 65536  # Each connection's reused receive buffer for commands and chat
+DATA_FRAME_SIZE = 1024 * 1024  # File data per DATA frame, sent with one sendfile call
+FILE_CHUNK = 1024 * 1024  # Uploads are written to disk in pieces of this size
 FILE_STORAGE_DIR = "shared_files"
+# Largest upload accepted (max_file_size_mb in config.ini). Space for an
+# upload is reserved before its data arrives, so the size a client declares
+# must be bounded
+MAX_UPLOAD_SIZE = 100 * 1024 * 1024
+LISTEN_BACKLOG = 1024  # Pending connections the kernel queues during a burst of connects
+MAX_CONNECTIONS = 256  # Connections served at once; more are turned away
+THREAD_STACK_SIZE = 256 * 1024  # Per connection thread, instead of the 8 MiB default
+connection_slots = threading.BoundedSemaphore(MAX_CONNECTIONS)  # One per connection thread
+
+# Tells the kernel more data follows at once, so a DATA frame header leaves
+# in the same packet as the start of its payload (Linux only)
+MSG_MORE = getattr(socket, "MSG_MORE", 0)
+
+# Everything sent to a client is a frame: kind byte + payload length + payload.
+# A download is answered with READY (payload: file size and CRC-32) and
+# then DATA frames, or with ERROR (payload: message).
+FRAME_HEADER = struct.Struct("!cI")
+FRAME_TEXT = b"T"
+FRAME_READY = b"R"
+FRAME_ERROR = b"E"
+FRAME_DATA = b"D"
+FILE_INFO = struct.Struct("!QI")  # file size, CRC-32 of the contents
+
+# /upload is followed directly by this header, the filename and the file data
+UPLOAD_HEADER = struct.Struct("!HQ")  # filename length, file size
+
+# Sent instead of a username on a connection that only fetches part of a file
+RANGE_COMMAND = b"/download_range "
+
+# Sent when a user joins and again for /help
+WELCOME_TEMPLATE = """
+Welcome to the Distributed Chat, {name}!
+Commands:
+  /quit          - Exit the chat
+  /users         - List online users
+  /files         - List shared files
+  /upload        - Upload a file
+  /download      - Download a file
+  /help          - Show this help message
+
+Type your message to chat with everyone!
+----------------------------------------
+"""
 
 # Ensure file storage directory exists
 if not os.path.exists(FILE_STORAGE_DIR):
     os.makedirs(FILE_STORAGE_DIR)
 
 
+def pack_frame(payload, kind=FRAME_TEXT):
+    """Return the bytes of one frame"""
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def send_packed(conn, frames, flags=0):
+    """Send already packed frames in one call; safe to call from any thread"""
+    with send_locks.get(conn) or contextlib.nullcontext():
+        conn.sendall(frames, flags)
+
+
+def send_frame(conn, payload, kind=FRAME_TEXT):
+    """Send one frame; safe to call from any thread"""
+    send_packed(conn, pack_frame(payload, kind))
+
+
+# Replies that never change, packed once and sent with send_packed
+NAME_PROMPT = pack_frame(b"Enter your name: ")
+BYE = pack_frame(b"[BYE] Goodbye!\n")
+NO_FILES = pack_frame(b"[FILES] No files available yet.\n")
+SERVER_FULL = pack_frame(b"[ERROR] Server is full, try again later\n")
+INVALID_FILE_NAME = pack_frame(b"[ERROR] Invalid file name\n")
+UPLOAD_TIMEOUT = pack_frame(b"[ERROR] Upload timeout\n")
+ERR_NO_FILENAME = pack_frame(b"No filename given", FRAME_ERROR)
+ERR_NOT_FOUND = pack_frame(b"File not found", FRAME_ERROR)
+ERR_NOT_ON_DISK = pack_frame(b"File not found on server", FRAME_ERROR)
+ERR_BAD_RANGE = pack_frame(b"Invalid range request", FRAME_ERROR)
+
+
+def send_data_frame(conn, f, offset, count):
+    """Send count bytes of file f, starting at offset, as one DATA frame.
+    
+    The payload goes from the page cache to the socket with sendfile(2),
+    never through Python. Returns count.
+    """
+    with send_locks.get(conn) or contextlib.nullcontext():
+        conn.sendall(FRAME_HEADER.pack(FRAME_DATA, count), MSG_MORE)
+        sent = conn.sendfile(f, offset, count)
+        if sent < count:
+            # The file shrank under us and the frame can never be completed,
+            # so nothing else sent on this connection would parse
+            conn.shutdown(socket.SHUT_RDWR)
+            raise ConnectionError("File changed while it was being sent")
+    return count
+
+
+# (second, b"HH:MM:SS") of the last chat timestamp handed out
+_last_timestamp = (None, b"")
+
+
+def chat_timestamp():
+    """Current time as b"HH:MM:SS", formatted at most once per second"""
+    global _last_timestamp
+    now = int(time.time())
+    second, stamp = _last_timestamp
+    if second != now:
+        stamp = time.strftime("%H:%M:%S", time.localtime(now)).encode()
+        _last_timestamp = (now, stamp)
+    return stamp
+
+
 def broadcast(msg, exclude=None):
     """Send message to all connected clients except the excluded one"""
+    # Framed once for everyone. The snapshot is read without a lock, so a
+    # slow client never holds up joins, leaves and /users for the others
+    frame = pack_frame(msg)
+    for conn, _ in clients_snapshot:
+        if conn is exclude:
+            continue
+        try:
+            send_packed(conn, frame)
+        except Exception:
+            cleanup_client(conn)
+
+
+def add_client(conn, client_info):
+    """Add a client to the chat"""
+    global clients_snapshot
     with clients_lock:
-        for conn in list(clients.keys()):
-            if conn is exclude:
-                continue
-            try:
-                conn.sendall(msg)
-            except Exception:
-                cleanup_client(conn)
+        clients[conn] = client_info
+        clients_snapshot = tuple(clients.items())
+
+
+def remove_client(conn):
+    """Remove a client from the chat; returns its info, or None if it was not in it"""
+    global clients_snapshot
+    with clients_lock:
+        client_info = clients.pop(conn, None)
+        if client_info is not None:
+            clients_snapshot = tuple(clients.items())
+    return client_info
 
 
 def cleanup_client(conn):
@@ -43,81 +178,175 @@ def cleanup_client(conn):
         conn.close()
     except Exception:
         pass
-    with clients_lock:
-        clients.pop(conn, None)
+    remove_client(conn)
+
+
+def recv_line(conn, client_info):
+    """Read one newline-terminated line from a client.
+    
+    Bytes received past the newline stay in the client's inbox for the next
+    read, so pipelined commands are never lost. Returns None on disconnect.
+    """
+    inbox = client_info["inbox"]
+    while True:
+        end = inbox.find(b"\n")
+        if end >= 0:
+            line = bytes(inbox[:end])
+            del inbox[:end + 1]
+            return line
+        n = conn.recv_into(client_info["rxbuf"])
+        if not n:
+            return None
+        inbox += client_info["rxbuf"][:n]
+
+
+def recv_bytes(conn, client_info, n):
+    """Read exactly n bytes from a client, starting with anything in its inbox"""
+    inbox = client_info["inbox"]
+    while len(inbox) < n:
+        got = conn.recv_into(client_info["rxbuf"])
+        if not got:
+            raise ConnectionError("Connection closed by client")
+        inbox += client_info["rxbuf"][:got]
+    data = bytes(inbox[:n])
+    del inbox[:n]
+    return data
+
+
+def discard_bytes(conn, client_info, n):
+    """Read and drop n bytes of an upload we are not going to store"""
+    inbox = client_info["inbox"]
+    dropped = min(len(inbox), n)
+    del inbox[:dropped]
+    while dropped < n:
+        received = conn.recv_into(client_info["rxbuf"], min(BUFFER_SIZE, n - dropped))
+        if not received:
+            break
+        dropped += received
+
+
+def drop_upload_connection(conn, client_info):
+    """Close the read side of a connection whose upload can't be skipped over.
+    
+    With the position in the upload unknown, whatever the client sends next
+    can't be told apart from file data, so none of it may be read as
+    commands or chat. The pending input is dropped and handle_client sees
+    the connection end.
+    """
+    client_info["inbox"].clear()
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def advise_sequential(f):
+    """Tell the kernel a file will be read front to back (bigger readahead)"""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def preallocate(f, size):
+    """Reserve size bytes for a file up front so the writes never extend it"""
+    if size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except OSError:
+            # Not supported by this filesystem; the writes extend the file
+            pass
 
 
 def send_file_list(conn):
     """Send the list of available files to a client"""
+    # Only the prebuilt rows are copied under the lock; the message is
+    # joined and sent after it is released
     with files_lock:
-        if not files_shared:
-            conn.sendall(b"[FILES] No files available yet.\n")
-        else:
-            msg = "[FILES] Available files:\n"
-            for idx, (filename, info) in enumerate(files_shared.items(), 1):
-                msg += f"  {idx}. {filename} ({info['size']} bytes) - uploaded by {info['uploader']} at {info['timestamp']}\n"
-            conn.sendall(msg.encode())
+        rows = [info["listing"] for info in files_shared.values()]
+    if not rows:
+        send_packed(conn, NO_FILES)
+    else:
+        msg = b"".join(b"  %d. %s\n" % (idx, row) for idx, row in enumerate(rows, 1))
+        send_frame(conn, b"[FILES] Available files:\n" + msg)
 
 
 def handle_file_upload(conn, client_info):
     """Handle file upload from client"""
     filepath = None
+    filesize = None  # Set once the whole header and filename have been read
+    received = 0
     try:
         print(f"[FILE] Upload request from {client_info['name']}")
         
-        # Receive filename and size
+        # Header and filename follow the command directly - no handshake
         conn.settimeout(30)  # Set timeout for file operations
-        print(f"[FILE] Waiting for metadata from {client_info['name']}...")
-        metadata = conn.recv(BUFFER_SIZE).decode('utf-8', 'ignore').strip()
-        
-        if not metadata:
-            print(f"[ERROR] No metadata received from {client_info['name']}")
-            conn.sendall(b"[ERROR] No metadata received\n")
-            return
+        name_len, size = UPLOAD_HEADER.unpack(recv_bytes(conn, client_info, UPLOAD_HEADER.size))
+        filename = recv_bytes(conn, client_info, name_len).decode('utf-8', 'ignore')
+        filesize = size
         
-        print(f"[FILE] Received metadata: {metadata}")
+        print(f"[FILE] File: {filename}, Size: {filesize} bytes")
         
-        parts = metadata.split('|')
-        if len(parts) != 2:
-            print(f"[ERROR] Invalid metadata format from {client_info['name']}: {metadata}")
-            conn.sendall(b"[ERROR] Invalid file metadata\n")
+        # The data is already on its way, so a rejected upload still has to
+        # be read off the socket to keep the next command in sync
+        if not filename or filename in (".", "..") or os.path.basename(filename) != filename:
+            print(f"[ERROR] Invalid file name from {client_info['name']}: {filename!r}")
+            discard_bytes(conn, client_info, filesize)
+            send_packed(conn, INVALID_FILE_NAME)
             return
         
-        filename = parts[0]
-        try:
-            filesize = int(parts[1])
-        except ValueError:
-            print(f"[ERROR] Invalid file size from {client_info['name']}: {parts[1]}")
-            conn.sendall(b"[ERROR] Invalid file size\n")
+        if filesize > MAX_UPLOAD_SIZE:
+            print(f"[ERROR] Upload of {filesize} bytes from {client_info['name']} is over the limit")
+            discard_bytes(conn, client_info, filesize)
+            limit_mb = MAX_UPLOAD_SIZE // (1024 * 1024)
+            send_frame(conn, f"[ERROR] File too large (limit {limit_mb} MB)\n".encode())
             return
         
-        print(f"[FILE] File: {filename}, Size: {filesize} bytes")
-        
-        # Send acknowledgment
-        conn.sendall(b"READY")
-        print(f"[FILE] Sent READY acknowledgment to {client_info['name']}")
-        
         # Receive file data
         filepath = os.path.join(FILE_STORAGE_DIR, filename)
-        received = 0
         
         print(f"[FILE] Receiving {filename} ({filesize} bytes) from {client_info['name']}...")
         
+        # The checksum is computed as the data arrives, never by reading
+        # the stored file back
+        crc = 0
         with open(filepath, 'wb') as f:
+            # One allocation for the whole file instead of one per write
+            preallocate(f, filesize)
+            
+            # Data that arrived together with the header comes first
+            inbox = client_info["inbox"]
+            if inbox:
+                # Taken off the inbox before the write, so a failed write
+                # leaves exactly filesize - received bytes to skip
+                head = inbox[:filesize]
+                del inbox[:len(head)]
+                received = len(head)
+                crc = zlib.crc32(head)
+                f.write(head)
+            
+            # The rest is received straight into one reused buffer and
+            # written out (and checksummed) a full buffer at a time; writes
+            # this large skip the file object's own buffer
+            buf = bytearray(min(FILE_CHUNK, max(filesize - received, 1)))
+            view = memoryview(buf)
+            filled = 0
             while received < filesize:
-                remaining = filesize - received
-                chunk_size = min(BUFFER_SIZE, remaining)
-                chunk = conn.recv(chunk_size)
+                n = conn.recv_into(view[filled:], min(len(buf) - filled, filesize - received))
                 
-                if not chunk:
+                if not n:
                     print(f"[ERROR] Connection lost while receiving file (received {received}/{filesize})")
                     break
                 
-                f.write(chunk)
-                received += len(chunk)
-                
-                # Progress update every 1MB
-                if received % (1024 * 1024) < BUFFER_SIZE or received == filesize:
+                filled += n
+                received += n
+                if filled == len(buf) or received == filesize:
+                    crc = zlib.crc32(view[:filled], crc)
+                    f.write(view[:filled])
+                    filled = 0
+                    
+                    # Progress update with each write (every 1MB), not per recv
                     progress = (received / filesize) * 100
                     print(f"[FILE] Progress: {received}/{filesize} bytes ({progress:.1f}%)")
         
@@ -125,15 +354,20 @@ def handle_file_upload(conn, client_info):
         
         if received == filesize:
             # Store file metadata
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # The file's /files row is rendered once, here
+            listing = f"{filename} ({filesize} bytes) - uploaded by {client_info['name']} at {timestamp}"
             with files_lock:
                 files_shared[filename] = {
                     "uploader": client_info["name"],
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "size": filesize
+                    "timestamp": timestamp,
+                    "size": filesize,
+                    "crc32": crc,
+                    "listing": listing.encode(),
                 }
             
             success_msg = f"[SUCCESS] File '{filename}' uploaded successfully!\n"
-            conn.sendall(success_msg.encode())
+            send_frame(conn, success_msg.encode())
             
             # Notify all users
             notification = f"[FILE] {client_info['name']} uploaded '{filename}' ({filesize} bytes)\n".encode()
@@ -141,7 +375,7 @@ def handle_file_upload(conn, client_info):
             print(f"[FILE] ✓ {filename} uploaded successfully by {client_info['name']}")
         else:
             error_msg = f"[ERROR] File upload incomplete (received {received}/{filesize} bytes)\n"
-            conn.sendall(error_msg.encode())
+            send_frame(conn, error_msg.encode())
             if os.path.exists(filepath):
                 os.remove(filepath)
                 print(f"[ERROR] Removed incomplete file: {filename}")
@@ -149,15 +383,29 @@ def handle_file_upload(conn, client_info):
     except socket.timeout:
         print(f"[ERROR] File upload timeout for {client_info['name']}")
         try:
-            conn.sendall(b"[ERROR] Upload timeout\n")
+            send_packed(conn, UPLOAD_TIMEOUT)
         except:
             pass
+        # The client stalled part way through, so the rest of the upload
+        # may still arrive later
+        drop_upload_connection(conn, client_info)
         if filepath and os.path.exists(filepath):
             os.remove(filepath)
     except Exception as e:
         print(f"[ERROR] File upload error from {client_info['name']}: {e}")
+        # A failure on our side (opening or writing the file) leaves the
+        # rest of the upload on its way: read it off so it isn't taken for
+        # commands and chat. Without a parsed header there's no telling
+        # where it ends
+        if filesize is None:
+            drop_upload_connection(conn, client_info)
+        else:
+            try:
+                discard_bytes(conn, client_info, filesize - received)
+            except OSError:
+                drop_upload_connection(conn, client_info)
         try:
-            conn.sendall(f"[ERROR] Upload failed: {e}\n".encode())
+            send_frame(conn, f"[ERROR] Upload failed: {e}\n".encode())
         except:
             pass
         if filepath and os.path.exists(filepath):
@@ -177,10 +425,12 @@ def handle_file_download(conn, client_info):
         # Receive filename
         conn.settimeout(30)  # Set timeout for file operations
         print(f"[FILE] Waiting for filename from {client_info['name']}...")
-        filename = conn.recv(BUFFER_SIZE).decode('utf-8', 'ignore').strip()
+        line = recv_line(conn, client_info)
+        filename = line.decode('utf-8', 'ignore').strip() if line else ""
         
         if not filename:
             print(f"[ERROR] No filename received from {client_info['name']}")
+            send_packed(conn, ERR_NO_FILENAME)
             return
         
         print(f"[FILE] Requested file: {filename}")
@@ -188,32 +438,25 @@ def handle_file_download(conn, client_info):
         filepath = os.path.join(FILE_STORAGE_DIR, filename)
         
         with files_lock:
-            if filename not in files_shared:
+            info = files_shared.get(filename)
+            if info is None:
                 print(f"[ERROR] File '{filename}' not in shared files list")
-                conn.sendall(b"ERROR|File not found")
+                send_packed(conn, ERR_NOT_FOUND)
                 conn.settimeout(None)
                 return
         
         if not os.path.exists(filepath):
             print(f"[ERROR] File '{filename}' not found on disk")
-            conn.sendall(b"ERROR|File not found on server")
+            send_packed(conn, ERR_NOT_ON_DISK)
             conn.settimeout(None)
             return
         
-        # Send file size
+        # File size and checksum, then the data right behind it - no
+        # acknowledgment round trip
         filesize = os.path.getsize(filepath)
-        response = f"OK|{filesize}"
-        conn.sendall(response.encode())
-        print(f"[FILE] Sent file info: {response}")
-        
-        # Wait for client acknowledgment
-        print(f"[FILE] Waiting for READY acknowledgment from {client_info['name']}...")
-        ack = conn.recv(BUFFER_SIZE)
-        
-        if ack != b"READY":
-            print(f"[ERROR] Invalid acknowledgment from {client_info['name']}: {ack}")
-            conn.settimeout(None)
-            return
+        ready = pack_frame(FILE_INFO.pack(filesize, info["crc32"]), FRAME_READY)
+        # With data to follow, READY waits to share a packet with the first frame
+        send_packed(conn, ready, MSG_MORE if filesize else 0)
         
         print(f"[FILE] Sending {filename} ({filesize} bytes) to {client_info['name']}...")
         
@@ -223,17 +466,13 @@ def handle_file_download(conn, client_info):
         # Send file data
         sent = 0
         with open(filepath, 'rb') as f:
+            advise_sequential(f)
             while sent < filesize:
-                chunk = f.read(BUFFER_SIZE)
-                if not chunk:
-                    break
-                conn.sendall(chunk)
-                sent += len(chunk)
+                sent += send_data_frame(conn, f, sent, min(DATA_FRAME_SIZE, filesize - sent))
                 
-                # Progress update every 1MB
-                if sent % (1024 * 1024) < BUFFER_SIZE or sent == filesize:
-                    progress = (sent / filesize) * 100
-                    print(f"[FILE] Download progress: {sent}/{filesize} bytes ({progress:.1f}%)")
+                # Progress update every frame (1MB)
+                progress = (sent / filesize) * 100
+                print(f"[FILE] Download progress: {sent}/{filesize} bytes ({progress:.1f}%)")
         
         print(f"[FILE] ✓ {filename} sent successfully to {client_info['name']}")
         
@@ -241,7 +480,6 @@ def handle_file_download(conn, client_info):
         print(f"[ERROR] File download timeout for {client_info['name']}")
     except Exception as e:
         print(f"[ERROR] File download error for {client_info['name']}: {e}")
-        import traceback
         traceback.print_exc()
     finally:
         # Always reset timeout to None after file operations
@@ -251,85 +489,132 @@ def handle_file_download(conn, client_info):
             pass
 
 
+def handle_range_download(conn, addr, request):
+    """Send one slice of a shared file on a connection of its own.
+    
+    Clients download large files over several connections at once. Each one
+    opens with "/download_range <filename> <offset> <length>" instead of a
+    username and gets READY (payload: size and CRC-32 of the whole file) followed
+    by the slice as DATA frames. It never joins the chat. A length of 0
+    only asks for the size.
+    """
+    try:
+        filename, offset, length = request.decode('utf-8', 'ignore').rsplit(" ", 2)
+        offset, length = int(offset), int(length)
+    except ValueError:
+        send_packed(conn, ERR_BAD_RANGE)
+        return
+    
+    filepath = os.path.join(FILE_STORAGE_DIR, filename)
+    with files_lock:
+        info = files_shared.get(filename)
+    if info is None or not os.path.exists(filepath):
+        send_packed(conn, ERR_NOT_FOUND)
+        return
+    
+    filesize = os.path.getsize(filepath)
+    if offset < 0 or length < 0 or offset > filesize:
+        send_packed(conn, ERR_BAD_RANGE)
+        return
+    
+    print(f"[FILE] Sending bytes {offset}-{offset + length} of {filename} to {addr}")
+    end = offset + min(length, filesize - offset)
+    ready = pack_frame(FILE_INFO.pack(filesize, info["crc32"]), FRAME_READY)
+    # Held back for the first DATA frame, unless this is only a size probe
+    send_packed(conn, ready, MSG_MORE if end > offset else 0)
+    with open(filepath, 'rb') as f:
+        advise_sequential(f)
+        while offset < end:
+            offset += send_data_frame(conn, f, offset, min(DATA_FRAME_SIZE, end - offset))
+
+
 def handle_client(conn, addr):
     """Handle individual client connection"""
-    client_info = {"name": None, "addr": addr}
+    client_info = {
+        "name": None,
+        "addr": addr,
+        "inbox": bytearray(),
+        # Every recv lands here first instead of in a new bytes object
+        "rxbuf": memoryview(bytearray(BUFFER_SIZE)),
+    }
+    send_locks[conn] = threading.Lock()
     
     try:
         # Get client name
-        conn.sendall(b"Enter your name: ")
-        name = conn.recv(1024).decode('utf-8', 'ignore').strip()
+        send_packed(conn, NAME_PROMPT)
+        line = recv_line(conn, client_info)
+        if line is None:
+            return
+        if line.startswith(RANGE_COMMAND):
+            handle_range_download(conn, addr, line[len(RANGE_COMMAND):])
+            return
+        name = line.decode('utf-8', 'ignore').strip()
         
         if not name:
             name = f"User_{addr[0]}:{addr[1]}"
         
         client_info["name"] = name
+        client_info["name_bytes"] = name.encode()
         
-        with clients_lock:
-            clients[conn] = client_info
+        add_client(conn, client_info)
         
-        # Notify all users about new join
+        # Notify the other users about the new join
         join_msg = f"* {name} joined the chat *\n".encode()
         print(f"[JOIN] {name} connected from {addr}")
-        broadcast(join_msg)
+        broadcast(join_msg, exclude=conn)
         
-        # Send welcome message and instructions
-        welcome = f"""
-Welcome to the Distributed Chat, {name}!
-Commands:
-  /quit          - Exit the chat
-  /users         - List online users
-  /files         - List shared files
-  /upload        - Upload a file
-  /download      - Download a file
-  /help          - Show this help message
-
-Type your message to chat with everyone!
-----------------------------------------
-"""
-        conn.sendall(welcome.encode())
+        # Welcome text is framed once and reused for /help
+        welcome_frame = pack_frame(WELCOME_TEMPLATE.format(name=name).encode())
+        
+        # The newcomer gets the join notice and the welcome in one send
+        send_packed(conn, pack_frame(join_msg) + welcome_frame)
         
-        # Main message loop
+        # Main message loop: one newline-terminated command or message per line
         while True:
-            data = conn.recv(BUFFER_SIZE)
-            if not data:
+            line = recv_line(conn, client_info)
+            if line is None:
                 break
             
-            text = data.decode('utf-8', 'ignore').strip()
+            # Commands are matched as bytes; only chat text gets decoded
+            command = line.strip()
             
-            if not text:
+            if not command:
                 continue
             
             # Handle commands
-            if text == "/quit":
-                conn.sendall(b"[BYE] Goodbye!\n")
+            if command == b"/quit":
+                send_packed(conn, BYE)
                 break
             
-            elif text == "/users":
-                with clients_lock:
-                    users_list = "[USERS] Online users:\n"
-                    for idx, info in enumerate(clients.values(), 1):
-                        users_list += f"  {idx}. {info['name']}\n"
-                    conn.sendall(users_list.encode())
+            elif command == b"/users":
+                names = [info["name_bytes"] for _, info in clients_snapshot]
+                rows = b"".join(b"  %d. %s\n" % (idx, nb) for idx, nb in enumerate(names, 1))
+                send_frame(conn, b"[USERS] Online users:\n" + rows)
             
-            elif text == "/files":
+            elif command == b"/files":
                 send_file_list(conn)
             
-            elif text == "/upload":
-                conn.sendall(b"[UPLOAD] Ready to receive file. Send metadata.\n")
+            elif command == b"/upload":
                 handle_file_upload(conn, client_info)
             
-            elif text == "/download":
-                # Don't send prompt - client already knows what file to request
+            elif command == b"/download":
+                # Filename follows on the next line
                 handle_file_download(conn, client_info)
             
-            elif text == "/help":
-                conn.sendall(welcome.encode())
+            elif command == b"/help":
+                send_packed(conn, welcome_frame)
             
             else:
-                # Regular chat message
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                msg = f"[{timestamp}] {name}: {text}\n".encode()
+                # Regular chat message. Valid UTF-8 is relayed as received;
+                # anything else is cleaned up by a lenient decode
+                try:
+                    text = command.decode('utf-8')
+                except UnicodeDecodeError:
+                    text = command.decode('utf-8', 'ignore')
+                    command = text.encode()
+                    if not command:
+                        continue
+                msg = b"[%s] %s: %s\n" % (chat_timestamp(), client_info["name_bytes"], command)
                 print(f"[CHAT] {name}: {text}")
                 broadcast(msg)  # Broadcast to all clients including sender
                 
@@ -338,29 +623,39 @@ Type your message to chat with everyone!
     
     finally:
         # Client disconnected
-        with clients_lock:
-            client_data = clients.pop(conn, None)
+        client_data = remove_client(conn)
         
         try:
             conn.close()
         except Exception:
             pass
+        send_locks.pop(conn, None)
         
         if client_data:
             leave_msg = f"* {client_data['name']} left the chat *\n".encode()
             print(f"[LEAVE] {client_data['name']} disconnected")
             broadcast(leave_msg)
+        
+        connection_slots.release()
 
 
 def main():
     """Main server function"""
-    import argparse
+    global MAX_UPLOAD_SIZE
     
     ap = argparse.ArgumentParser(description="Distributed Chat Server with File Sharing")
     ap.add_argument("--host", default="0.0.0.0", help="Server host address")
     ap.add_argument("--port", type=int, default=5000, help="Server port")
+    ap.add_argument("--max-upload-mb", type=int, default=MAX_UPLOAD_SIZE // (1024 * 1024),
+                    help="Largest file accepted for upload, in MB")
+    ap.add_argument("--sndbuf", type=int, default=None,
+                    help="Kernel send buffer size per connection (default: OS autotuning)")
+    ap.add_argument("--rcvbuf", type=int, default=None,
+                    help="Kernel receive buffer size per connection (default: OS autotuning)")
     args = ap.parse_args()
     
+    MAX_UPLOAD_SIZE = args.max_upload_mb * 1024 * 1024
+    
     print("=" * 60)
     print("  DISTRIBUTED CHAT SERVER WITH FILE SHARING")
     print("=" * 60)
@@ -370,14 +665,44 @@ def main():
     print("=" * 60)
     print()
     
+    # Handler threads only run this module's code; they don't need the
+    # default stack
+    threading.stack_size(THREAD_STACK_SIZE)
+    
     try:
-        with socket.create_server((args.host, args.port), reuse_port=False) as server_socket:
-            server_socket.listen()
+        with socket.create_server((args.host, args.port), backlog=LISTEN_BACKLOG) as server_socket:
+            # Accepted connections inherit these, and the receive size is in
+            # place before their handshake sets the window scale. Left unset,
+            # the kernel sizes each connection's buffers itself
+            if args.sndbuf:
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, args.sndbuf)
+            if args.rcvbuf:
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, args.rcvbuf)
+            
             print(f"[SERVER] Listening on {args.host}:{args.port}")
             print("[SERVER] Waiting for connections...\n")
             
             while True:
                 conn, addr = server_socket.accept()
+                
+                # Threads are bounded: past the limit a connection is told so
+                # and closed instead of getting a thread of its own
+                if not connection_slots.acquire(blocking=False):
+                    print(f"[SERVER] Too many connections, refusing {addr}")
+                    try:
+                        send_packed(conn, SERVER_FULL)
+                    except OSError:
+                        pass
+                    conn.close()
+                    continue
+                
+                # Replies and broadcasts are small frames: send them at once
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if hasattr(socket, "TCP_QUICKACK"):
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+                
+                # Notice clients that vanished without closing the connection
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
                 thread = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
                 thread.start()
                 
@@ -3,26 +3,44 @@ Quick Test Script for File Sharing Fix
 Run this after starting the server to verify file operations work correctly
 """
 
+import mmap
 import os
 import sys
 
+COMPARE_CHUNK = 1024 * 1024  # compare_files checks this much at a time
+TEST_FILES = ("test_small.txt", "test_medium.txt", "test_binary.dat")
+
+def stat_or_none(path):
+    """os.stat(path), or None if it doesn't exist (one syscall for both)"""
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+def write_file(path, data):
+    """Write bytes to a new file with raw os.write calls (no file object layers)"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
 def create_test_files():
     """Create sample files for testing"""
     print("Creating test files...")
     
     # Create small text file
-    with open("test_small.txt", "w") as f:
-        f.write("This is a small test file.\n" * 10)
+    write_file("test_small.txt", b"This is a small test file.\n" * 10)
     print("✓ Created test_small.txt (260 bytes)")
     
     # Create medium text file
-    with open("test_medium.txt", "w") as f:
-        f.write("This is a medium test file with more content.\n" * 100)
+    write_file("test_medium.txt", b"This is a medium test file with more content.\n" * 100)
     print("✓ Created test_medium.txt (~4.6 KB)")
     
     # Create a binary file
-    with open("test_binary.dat", "wb") as f:
-        f.write(bytes(range(256)) * 100)
+    write_file("test_binary.dat", bytes(range(256)) * 100)
     print("✓ Created test_binary.dat (25.6 KB)")
     
     print("\n✅ Test files created successfully!")
@@ -39,46 +57,60 @@ def check_directories():
     
     dirs = ["shared_files", "downloads"]
     for d in dirs:
-        if os.path.exists(d):
-            files = os.listdir(d)
-            print(f"✓ {d}/ exists ({len(files)} files)")
-            if files:
-                print(f"  Files: {', '.join(files)}")
-        else:
+        # Scanning a missing directory fails, so no separate exists() check
+        try:
+            with os.scandir(d) as entries:
+                files = [entry.name for entry in entries]
+        except FileNotFoundError:
             print(f"✗ {d}/ does not exist (will be created automatically)")
+            continue
+        print(f"✓ {d}/ exists ({len(files)} files)")
+        if files:
+            print(f"  Files: {', '.join(files)}")
 
 def verify_files():
     """Verify test files exist"""
     print("\nVerifying test files...")
     
-    test_files = ["test_small.txt", "test_medium.txt", "test_binary.dat"]
-    for f in test_files:
-        if os.path.exists(f):
-            size = os.path.getsize(f)
-            print(f"✓ {f} exists ({size} bytes)")
+    for f in TEST_FILES:
+        st = stat_or_none(f)
+        if st:
+            print(f"✓ {f} exists ({st.st_size} bytes)")
         else:
             print(f"✗ {f} not found")
 
-def compare_files(file1, file2):
-    """Compare two files to verify they match"""
-    if not os.path.exists(file1):
-        print(f"✗ {file1} not found")
-        return False
+def compare_pair(pair):
+    """Compare a (file1, file2) pair, returning (matched, message)"""
+    file1, file2 = pair
+    st1 = stat_or_none(file1)
+    if not st1:
+        return False, f"✗ {file1} not found"
     
-    if not os.path.exists(file2):
-        print(f"✗ {file2} not found")
-        return False
+    st2 = stat_or_none(file2)
+    if not st2:
+        return False, f"✗ {file2} not found"
     
-    with open(file1, 'rb') as f1, open(file2, 'rb') as f2:
-        content1 = f1.read()
-        content2 = f2.read()
-        
-        if content1 == content2:
-            print(f"✓ {file1} and {file2} match perfectly!")
-            return True
-        else:
-            print(f"✗ {file1} and {file2} do NOT match")
-            return False
+    # Files of different sizes can't match; otherwise compare them a chunk
+    # at a time straight from the page cache and stop at the first difference
+    size = st1.st_size
+    if size != st2.st_size:
+        return False, f"✗ {file1} and {file2} do NOT match"
+    
+    if size:
+        with open(file1, 'rb') as f1, open(file2, 'rb') as f2, \
+                mmap.mmap(f1.fileno(), 0, access=mmap.ACCESS_READ) as m1, \
+                mmap.mmap(f2.fileno(), 0, access=mmap.ACCESS_READ) as m2:
+            for offset in range(0, size, COMPARE_CHUNK):
+                if m1[offset:offset + COMPARE_CHUNK] != m2[offset:offset + COMPARE_CHUNK]:
+                    return False, f"✗ {file1} and {file2} do NOT match"
+    
+    return True, f"✓ {file1} and {file2} match perfectly!"
+
+def compare_files(file1, file2):
+    """Compare two files to verify they match"""
+    matched, message = compare_pair((file1, file2))
+    print(message)
+    return matched
 
 def test_upload_download():
     """Test file integrity after upload/download cycle"""
@@ -86,61 +118,64 @@ def test_upload_download():
     print("This test compares original files with downloaded versions")
     print()
     
-    test_files = ["test_small.txt", "test_medium.txt", "test_binary.dat"]
-    
-    for filename in test_files:
-        original = filename
+    for filename in TEST_FILES:
         downloaded = os.path.join("downloads", filename)
         
-        if os.path.exists(original) and os.path.exists(downloaded):
-            compare_files(original, downloaded)
-        elif not os.path.exists(downloaded):
+        if not stat_or_none(downloaded):
             print(f"⚠ {downloaded} not found - upload/download {filename} first")
+        elif not stat_or_none(filename):
+            print(f"⚠ {filename} not found - run create_test_files() first")
         else:
-            print(f"⚠ {original} not found - run create_test_files() first")
+            compare_files(filename, downloaded)
 
-def main():
-    """Main test menu"""
-    print("=" * 70)
-    print("  FILE SHARING FIX - TEST UTILITY")
-    print("=" * 70)
+def run_all_checks():
+    """Run every check in order"""
+    create_test_files()
     print()
-    print("Choose an option:")
-    print("  1. Create test files")
-    print("  2. Check directories")
-    print("  3. Verify test files exist")
-    print("  4. Test file integrity (after upload/download)")
-    print("  5. Run all checks")
-    print("  q. Quit")
+    check_directories()
     print()
-    
-    choice = input("Enter choice: ").strip()
-    
-    if choice == "1":
-        create_test_files()
-    elif choice == "2":
-        check_directories()
-    elif choice == "3":
-        verify_files()
-    elif choice == "4":
-        test_upload_download()
-    elif choice == "5":
-        create_test_files()
+    verify_files()
+    print()
+    test_upload_download()
+
+MENU_ACTIONS = {
+    "1": create_test_files,
+    "2": check_directories,
+    "3": verify_files,
+    "4": test_upload_download,
+    "5": run_all_checks,
+}
+
+def main():
+    """Main test menu"""
+    while True:
+        print("=" * 70)
+        print("  FILE SHARING FIX - TEST UTILITY")
+        print("=" * 70)
         print()
-        check_directories()
+        print("Choose an option:")
+        print("  1. Create test files")
+        print("  2. Check directories")
+        print("  3. Verify test files exist")
+        print("  4. Test file integrity (after upload/download)")
+        print("  5. Run all checks")
+        print("  q. Quit")
         print()
-        verify_files()
+        
+        choice = input("Enter choice: ").strip()
+        
+        if choice.lower() == "q":
+            print("Exiting...")
+            break
+        
+        action = MENU_ACTIONS.get(choice)
+        if action:
+            action()
+        else:
+            print("Invalid choice")
+        
         print()
-        test_upload_download()
-    elif choice.lower() == "q":
-        print("Exiting...")
-        sys.exit(0)
-    else:
-        print("Invalid choice")
-    
-    print()
-    input("Press Enter to continue...")
-    main()
+        input("Press Enter to continue...")
 
 if __name__ == "__main__":
     try:
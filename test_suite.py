@@ -3,10 +3,57 @@ Test script for the Distributed Chat Application
 Run various test scenarios to verify functionality
 """
 
+import ast
+import importlib.util
+import io
+import shutil
+import socket
+import struct
 import subprocess
+import tempfile
+import threading
 import time
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Backoff (seconds) between connection attempts while the test server starts
+SERVER_PROBE_DELAYS = (0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+REQUIRED_FILES = (
+    "server.py",
+    "client_console.py",
+    "client_gui.py",
+    "README.md",
+    "QUICKSTART.md",
+    "requirements.txt",
+    "config.ini",
+)
+PY_FILES = ("server.py", "client_console.py", "client_gui.py")
+NAME_WIDTH = 25  # column width for file and test names in the report
+
+class ThreadOutput:
+    """sys.stdout stand-in that sends each test thread's prints to its own buffer"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        return getattr(self.local, 'buffer', self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def run_captured(output, test):
+    """Run one test with its output collected, returning (result, output text)"""
+    output.local.buffer = io.StringIO()
+    try:
+        return test(), output.local.buffer.getvalue()
+    finally:
+        del output.local.buffer
 
 def print_section(title):
     """Print a formatted section header"""
@@ -14,6 +61,137 @@ def print_section(title):
     print(f"  {title}")
     print("="*60 + "\n")
 
+def wait_for_server(server_process, port):
+    """Wait until the server accepts connections instead of sleeping a fixed
+    time; gives up early if it exits. Returns True once it is ready"""
+    for delay in SERVER_PROBE_DELAYS:
+        if server_process.poll() is not None:
+            return False
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=delay).close()
+            return True
+        except OSError:
+            time.sleep(delay)
+    return False
+
+def recv_exact(sock, n):
+    """Read exactly n bytes from a socket"""
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("Server closed the connection")
+        data += chunk
+    return data
+
+def start_scratch_server(port):
+    """Start a server in a scratch directory (it stores uploads in its
+    working directory); returns (process, directory)"""
+    workdir = tempfile.mkdtemp()
+    server_process = subprocess.Popen(
+        [sys.executable, "-I", "-B", os.path.abspath("server.py"), "--port", str(port)],
+        cwd=workdir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+    return server_process, workdir
+
+def stop_scratch_server(server_process, workdir):
+    """Stop a server from start_scratch_server and remove its directory"""
+    server_process.terminate()
+    server_process.wait(timeout=5)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+def recv_text(sock):
+    """Read the next frame from the server and return its payload as text"""
+    kind, length = struct.unpack("!cI", recv_exact(sock, 5))
+    return recv_exact(sock, length).decode('utf-8', 'replace')
+
+def send_upload(sock, name, data):
+    """Send an upload the way the clients do: command, header, name, data"""
+    sock.sendall(b"/upload\n" + struct.pack("!HQ", len(name), len(data)) + name + data)
+
+def test_split_upload():
+    """Test an upload whose header arrives in separate segments"""
+    print_section("TEST 6: Split Upload Header")
+    
+    server_process, workdir = start_scratch_server(5002)
+    try:
+        if not wait_for_server(server_process, 5002):
+            print("✗ Server failed to start")
+            return False
+        
+        # A '/quit' line in the data must be stored, never run as a command
+        name = b"split.txt"
+        data = b"first line\n/quit\nlast line\n"
+        header = struct.pack("!HQ", len(name), len(data))
+        with socket.create_connection(("127.0.0.1", 5002), timeout=10) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall(b"tester\n/upload\n")
+            for part in (header[:4], header[4:], name + data):
+                time.sleep(0.1)
+                sock.sendall(part)
+            
+            # Skip the welcome frames until the upload is answered
+            while True:
+                text = recv_text(sock)
+                if "[SUCCESS]" in text or "[ERROR]" in text:
+                    break
+        
+        if "[SUCCESS]" not in text:
+            print(f"✗ Upload failed: {text.strip()}")
+            return False
+        with open(os.path.join(workdir, "shared_files", "split.txt"), 'rb') as f:
+            if f.read() != data:
+                print("✗ Stored file does not match what was sent")
+                return False
+        print("✓ Upload with a split header stored intact")
+        return True
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        return False
+    finally:
+        stop_scratch_server(server_process, workdir)
+
+def test_failed_upload():
+    """Test that the body of an upload the server can't store is skipped"""
+    print_section("TEST 7: Failed Upload")
+    
+    server_process, workdir = start_scratch_server(5003)
+    try:
+        if not wait_for_server(server_process, 5003):
+            print("✗ Server failed to start")
+            return False
+        
+        # A name too long for the filesystem makes open() fail after the
+        # header has been read; none of the body may reach the chat
+        name = b"x" * 300
+        data = b"secret password line\n/users\n"
+        with socket.create_connection(("127.0.0.1", 5003), timeout=10) as sock:
+            sock.sendall(b"tester\n")
+            send_upload(sock, name, data)
+            sock.sendall(b"after the upload\n")
+            
+            # Everything up to the chat line sent after the upload
+            replies = []
+            while "after the upload" not in (replies[-1] if replies else ""):
+                replies.append(recv_text(sock))
+        
+        if not any("[ERROR]" in text for text in replies):
+            print("✗ Server did not report the failed upload")
+            return False
+        if any("secret" in text or "[USERS]" in text for text in replies):
+            print("✗ Upload data was read as chat or commands")
+            return False
+        print("✓ Failed upload reported and its data skipped")
+        return True
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        return False
+    finally:
+        stop_scratch_server(server_process, workdir)
+
 def test_server_start():
     """Test if server can start"""
     print_section("TEST 1: Server Startup")
@@ -21,18 +199,18 @@ def test_server_start():
     print("Starting server in background...")
     try:
         # Start server process
+        # -I keeps the user's environment and site-packages out of the test;
+        # -B stops the child writing .pyc files
         server_process = subprocess.Popen(
-            [sys.executable, "server.py", "--port", "5001"],
+            [sys.executable, "-I", "-B", "server.py", "--port", "5001"],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True
+            text=True,
+            start_new_session=True
         )
         
-        # Wait a moment for server to start
-        time.sleep(2)
-        
         # Check if still running
-        if server_process.poll() is None:
+        if wait_for_server(server_process, 5001) and server_process.poll() is None:
             print("✓ Server started successfully!")
             print("✓ Server is running on port 5001")
             
@@ -42,7 +220,9 @@ def test_server_start():
             print("✓ Server stopped cleanly")
             return True
         else:
-            stdout, stderr = server_process.communicate()
+            if server_process.poll() is None:
+                server_process.terminate()
+            stdout, stderr = server_process.communicate(timeout=5)
             print("✗ Server failed to start")
             print(f"Error: {stderr}")
             return False
@@ -66,11 +246,14 @@ def test_imports():
     all_passed = True
     
     for module_name, used_in in modules:
-        try:
-            __import__(module_name)
+        # find_spec locates the module without running it (tkinter would
+        # otherwise load Tk just to be checked). The tkinter package is often
+        # present without its _tkinter extension, so look for that as well
+        names = (module_name, "_tkinter") if module_name == "tkinter" else (module_name,)
+        if all(importlib.util.find_spec(name) is not None for name in names):
             print(f"✓ {module_name:15} - OK (used in {used_in})")
-        except ImportError as e:
-            print(f"✗ {module_name:15} - FAILED: {e}")
+        else:
+            print(f"✗ {module_name:15} - FAILED: No module named '{module_name}'")
             if module_name == "tkinter":
                 print("  Note: tkinter is optional. Console client will still work.")
             else:
@@ -82,24 +265,18 @@ def test_file_structure():
     """Test if all required files exist"""
     print_section("TEST 3: File Structure")
     
-    required_files = [
-        "server.py",
-        "client_console.py",
-        "client_gui.py",
-        "README.md",
-        "QUICKSTART.md",
-        "requirements.txt",
-        "config.ini",
-    ]
-    
     all_exist = True
     
-    for filename in required_files:
-        if os.path.exists(filename):
-            size = os.path.getsize(filename)
-            print(f"✓ {filename:25} - {size:6} bytes")
+    for filename in REQUIRED_FILES:
+        # One stat both checks existence and gives the size
+        try:
+            size = os.stat(filename).st_size
+        except FileNotFoundError:
+            size = None
+        if size is not None:
+            print(f"✓ {filename:{NAME_WIDTH}} - {size:6} bytes")
         else:
-            print(f"✗ {filename:25} - NOT FOUND")
+            print(f"✗ {filename:{NAME_WIDTH}} - NOT FOUND")
             all_exist = False
     
     return all_exist
@@ -108,26 +285,21 @@ def test_code_syntax():
     """Test if Python files have valid syntax"""
     print_section("TEST 4: Code Syntax Check")
     
-    py_files = ["server.py", "client_console.py", "client_gui.py"]
     all_valid = True
     
-    for filename in py_files:
+    for filename in PY_FILES:
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                compile(f.read(), filename, 'exec')
-            print(f"✓ {filename:25} - Valid syntax")
+            # Parsing is all a syntax check needs (no bytecode). Given bytes,
+            # the parser honours the file's own encoding declaration
+            with open(filename, 'rb') as f:
+                ast.parse(f.read(), filename)
+            print(f"✓ {filename:{NAME_WIDTH}} - Valid syntax")
         except SyntaxError as e:
-            print(f"✗ {filename:25} - Syntax error: {e}")
+            print(f"✗ {filename:{NAME_WIDTH}} - Syntax error: {e}")
+            all_valid = False
+        except Exception as e:
+            print(f"✗ {filename:{NAME_WIDTH}} - Error: {e}")
             all_valid = False
-        except UnicodeDecodeError:
-            # Try with different encoding
-            try:
-                with open(filename, 'r', encoding='latin-1') as f:
-                    compile(f.read(), filename, 'exec')
-                print(f"✓ {filename:25} - Valid syntax")
-            except Exception as e:
-                print(f"✗ {filename:25} - Error: {e}")
-                all_valid = False
     
     return all_valid
 
@@ -167,14 +339,31 @@ def main():
     print("  DISTRIBUTED CHAT APPLICATION - TEST SUITE")
     print("█"*60)
     
+    tests = {
+        "File Structure": test_file_structure,
+        "Module Imports": test_imports,
+        "Code Syntax": test_code_syntax,
+        "Test File Creation": create_test_file,
+        "Server Startup": test_server_start,
+        "Split Upload": test_split_upload,
+        "Failed Upload": test_failed_upload,
+    }
     results = {}
     
-    # Run all tests
-    results["File Structure"] = test_file_structure()
-    results["Module Imports"] = test_imports()
-    results["Code Syntax"] = test_code_syntax()
-    results["Test File Creation"] = create_test_file()
-    results["Server Startup"] = test_server_start()
+    # The tests are independent and mostly wait on I/O (the server test
+    # sleeps while it starts up), so run them together. Each one's output
+    # is captured and printed in the usual order so sections don't interleave
+    output = ThreadOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=len(tests)) as pool:
+            futures = {name: pool.submit(run_captured, output, test)
+                       for name, test in tests.items()}
+            for name, future in futures.items():
+                results[name], text = future.result()
+                output.stream.write(text)
+    finally:
+        sys.stdout = output.stream
     
     # Summary
     print_section("TEST SUMMARY")
@@ -184,7 +373,7 @@ def main():
     
     for test_name, result in results.items():
         status = "✓ PASSED" if result else "✗ FAILED"
-        print(f"{test_name:25} - {status}")
+        print(f"{test_name:{NAME_WIDTH}} - {status}")
     
     print(f"\n{'='*60}")
     print(f"  Results: {passed}/{total} tests passed")